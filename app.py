@@ -4,18 +4,17 @@ from flask import Flask, render_template, request, jsonify
 
 
 import os
+import hmac
 from dotenv import load_dotenv
-from gemini_api import call_gemini_api
+from gemini_api import ask_gemini, index_version, COLLECTION_NAME
+import index_jobs
+from medicine_db import get_medicine_index
+from sessions import get_session_store, valid_session_id, history_text, rewrite_query
+from warmup import warmup, log_prompt
 load_dotenv()
 app = Flask(__name__)
 
 
-# Temporary in-memory medicine data
-temp_medicine_db = {
-    "paracetamol": {"name": "Paracetamol", "usage": "Pain relief", "dosage": "500mg"},
-    "ibuprofen": {"name": "Ibuprofen", "usage": "Anti-inflammatory", "dosage": "200mg"}
-}
-
 # Gemini API key (now loaded from environment variable)
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 
@@ -28,17 +27,79 @@ def index():
 def ask():
     data = request.json
     user_prompt = data.get("prompt", "")
-    # Gemini API now uses RAG workflow and custom allergy data
-    gemini_response = call_gemini_api(user_prompt, GEMINI_API_KEY)
+    session_id = data.get("session_id")
+    log_prompt(user_prompt)
+    session = get_session_store().get(session_id) if valid_session_id(session_id) else None
+    # frequent questions asked without earlier context are answered from the warm-up store
+    warm = None if session and history_text(session) else warmup.lookup(user_prompt)
+    if warm:
+        result = {"answer": warm["answer"], "degraded": False, "reason": None}
+        if session is not None:
+            get_session_store().append(session_id, user_prompt, result["answer"])
+    elif session is not None:
+        # follow-ups get the conversation and a retrieval query that keeps the topic
+        result = ask_gemini(user_prompt, GEMINI_API_KEY, history=history_text(session),
+                            retrieval_query=rewrite_query(session, user_prompt))
+        get_session_store().append(session_id, user_prompt, result["answer"])
+    else:
+        # Gemini API now uses RAG workflow and custom allergy data
+        result = ask_gemini(user_prompt, GEMINI_API_KEY)
+    gemini_response = result["answer"]
 
-    # If user asked for a medicine, try to add medicine info
-    medicine = temp_medicine_db.get(user_prompt.lower())
-    if medicine:
-        med_info = f"{medicine['name']} is used for {medicine['usage']}. Recommended dosage: {medicine['dosage']}."
+    # If user mentioned medicines (exact names, brands or typos), add medicine info
+    medicines = get_medicine_index().lookup(user_prompt)
+    if medicines:
+        med_info = "\n".join(
+            f"{m['name']} is used for {m['usage']}. Recommended dosage: {m['dosage']}." for m in medicines
+        )
         response = f"{gemini_response}\n\n{med_info}"
     else:
         response = gemini_response
-    return jsonify({"result": response})
+    return jsonify({"result": response, "degraded": result["degraded"]})
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness probe: 503 until the warm-up answers for the serving index are loaded."""
+    warmup.ensure_started()
+    status = {**warmup.status, "ready": warmup.is_ready()}
+    return jsonify(status), 200 if status["ready"] else 503
+
+
+# Admin endpoints for background index rebuilds (disabled unless ADMIN_TOKEN is set)
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+
+def _is_admin():
+    # constant-time comparison, so response timing does not reveal how much of a guess was right
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+
+@app.route("/admin/index", methods=["GET"])
+def admin_index_status():
+    if not _is_admin():
+        return jsonify({"error": "forbidden"}), 403
+    return jsonify({"collection": COLLECTION_NAME, "serving_version": index_version()})
+
+
+@app.route("/admin/index/rebuild", methods=["POST"])
+def admin_index_rebuild():
+    if not _is_admin():
+        return jsonify({"error": "forbidden"}), 403
+    job = index_jobs.start_rebuild(COLLECTION_NAME)
+    return jsonify(job), 202
+
+
+@app.route("/admin/index/jobs/<job_id>", methods=["GET"])
+def admin_index_job(job_id):
+    if not _is_admin():
+        return jsonify({"error": "forbidden"}), 403
+    job = index_jobs.read_status(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(job)
+
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,162 @@
+# batch_ask.py
+# Offline batch question answering through the same RAG flow as /api/ask.
+# Questions are embedded and retrieved in batches, answered concurrently under the
+# quota governor, and written to JSONL as they finish; reruns skip answered questions.
+import os
+import csv
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+import reranker
+from gemini_api import get_embedder, get_store, ask_gemini, TOP_K
+from llm_governor import governor, PRIORITY_BATCH
+load_dotenv()
+
+RETRIEVE_BATCH = 256
+
+
+def question_id(question):
+    return hashlib.sha1(" ".join(question.lower().split()).encode("utf-8")).hexdigest()[:16]
+
+
+def read_questions(path):
+    """Questions from JSONL ({"question"|"prompt", optional "id"}) or CSV (same columns)."""
+    rows = []
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    questions = []
+    for row in rows:
+        text = (row.get("question") or row.get("prompt") or "").strip()
+        if text:
+            questions.append({"id": str(row.get("id") or question_id(text)), "question": text})
+    return questions
+
+
+def answered_ids(path):
+    """Ids already answered in an earlier run (degraded answers are retried)."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # a partially written last line from an interrupted run
+            if rec.get("degraded"):
+                done.discard(rec["id"])
+            else:
+                done.add(rec["id"])
+    return done
+
+
+def compact_output(path):
+    """
+    Rewrite the results file with one line per question id, in first-answered order:
+    the last non-degraded answer, or the last attempt if every attempt was degraded.
+    """
+    if not os.path.exists(path):
+        return
+    best = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if not rec.get("degraded") or best.get(rec["id"], rec).get("degraded"):
+                best[rec["id"]] = rec
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for rec in best.values():
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+
+
+def retrieve_batch(questions, k=TOP_K):
+    """Embed all questions in one call and query the store in batches. Returns hits and per-question ms."""
+    texts = [q["question"] for q in questions]
+    t0 = time.perf_counter()
+    embeddings = get_embedder().encode(texts, batch_size=64)
+    embed_ms = (time.perf_counter() - t0) * 1000 / max(1, len(texts))
+
+    fetch_k = max(reranker.RERANK_CANDIDATES, k) if reranker.RERANK_ENABLED else k
+    t0 = time.perf_counter()
+    hits = []
+    for start in range(0, len(texts), RETRIEVE_BATCH):
+        hits.extend(get_store().query_batch(embeddings[start:start + RETRIEVE_BATCH], k=fetch_k))
+    retrieve_ms = (time.perf_counter() - t0) * 1000 / max(1, len(texts))
+
+    rerank_ms = [0.0] * len(texts)
+    if reranker.RERANK_ENABLED:
+        for i, text in enumerate(texts):
+            t0 = time.perf_counter()
+            hits[i] = reranker.rerank(text, hits[i], top_k=min(k, reranker.RERANK_TOP_K))
+            rerank_ms[i] = (time.perf_counter() - t0) * 1000
+    return hits, embed_ms, retrieve_ms, rerank_ms
+
+
+def run(input_path, output_path, api_key, concurrency=4, rpm=None, tpm=None, limit=None):
+    questions = read_questions(input_path)
+    done = answered_ids(output_path)
+    pending = [q for q in questions if q["id"] not in done]
+    # the same question may appear twice in the input; answer it once
+    pending = list({q["id"]: q for q in pending}.values())
+    if limit:
+        pending = pending[:limit]
+    print(f"{len(questions)} questions, {len(questions) - len(pending)} already answered, {len(pending)} to run")
+    if not pending:
+        compact_output(output_path)
+        return
+
+    if rpm or tpm:
+        governor.set_budget(rpm=rpm, tpm=tpm)
+    hits, embed_ms, retrieve_ms, rerank_ms = retrieve_batch(pending)
+
+    def answer(i):
+        t0 = time.perf_counter()
+        try:
+            # batch work waits for quota instead of degrading, but yields to interactive traffic
+            result = ask_gemini(pending[i]["question"], api_key, hits=hits[i], priority=PRIORITY_BATCH,
+                                deadline_s=3600)
+        except Exception as e:
+            # one failing question must not abort the batch; recorded as degraded, it is retried next run
+            result = {"answer": None, "degraded": True, "reason": f"error: {type(e).__name__}: {e}"}
+        return i, result, (time.perf_counter() - t0) * 1000
+
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(answer, i) for i in range(len(pending))]
+        for n, future in enumerate(as_completed(futures), start=1):
+            i, result, generate_ms = future.result()
+            timings = {"embed_ms": round(embed_ms, 2), "retrieve_ms": round(retrieve_ms, 2),
+                       "rerank_ms": round(rerank_ms[i], 2), "generate_ms": round(generate_ms, 1)}
+            timings["total_ms"] = round(sum(timings.values()), 1)
+            record = {**pending[i], "answer": result["answer"], "degraded": result["degraded"],
+                      "reason": result["reason"], "sources": [h["id"] for h in hits[i]], "timings": timings}
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            if n % 10 == 0 or n == len(pending):
+                print(f"{n}/{len(pending)} answered")
+    # retried questions left earlier degraded lines behind; keep one line per id
+    compact_output(output_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a file of questions with the RAG pipeline")
+    parser.add_argument("input", help="questions as .jsonl or .csv (column 'question' or 'prompt', optional 'id')")
+    parser.add_argument("output", help="results .jsonl (appended to; rerun to resume)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=float, help="requests per minute budget for this run")
+    parser.add_argument("--tpm", type=float, help="tokens per minute budget for this run")
+    parser.add_argument("--limit", type=int, help="answer at most this many new questions")
+    args = parser.parse_args()
+
+    run(args.input, args.output, os.environ.get("GEMINI_API_KEY"), concurrency=args.concurrency,
+        rpm=args.rpm, tpm=args.tpm, limit=args.limit)
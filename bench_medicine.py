@@ -0,0 +1,80 @@
+# bench_medicine.py
+# Build time, memory and lookup latency of the medicine index at 100k synthetic entries.
+import time
+import random
+import argparse
+import statistics
+import tracemalloc
+from medicine_db import MedicineIndex
+
+# consonant-vowel syllables plus typical drug-name endings give pronounceable, varied names
+SYLLABLES = [c + v for c in "bcdfglmnprstvxz" for v in "aeiou"] + ["tra", "cef", "pro", "clo", "fen", "zol"]
+ENDINGS = ["", "", "mol", "zine", "pril", "statin", "cillin", "mab", "tide", "vir", "zole", "dine", "fen"]
+STRENGTHS = ["5", "10", "20", "40", "100", "250", "500", "625", "650"]
+
+
+def _word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))) + rng.choice(ENDINGS)
+
+
+def _typo(rng, word):
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1:]
+
+
+def build_synthetic(n, seed=0):
+    rng = random.Random(seed)
+    index = MedicineIndex()
+    generics = []
+    for _ in range(n):
+        generic = _word(rng)
+        brands = [_word(rng).capitalize() for _ in range(rng.randint(1, 2))]
+        brands.append(f"{brands[0]} {rng.choice(STRENGTHS)}")
+        index.add(generic.capitalize(), generic, brands, "Synthetic usage", f"{rng.choice(STRENGTHS)}mg")
+        generics.append(generic)
+    index.prepare()
+    return index, generics
+
+
+def _time_us(fn, prompts):
+    timings = []
+    for p in prompts:
+        t0 = time.perf_counter()
+        fn(p)
+        timings.append((time.perf_counter() - t0) * 1e6)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the medicine index")
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    index, generics = build_synthetic(args.entries)
+    build_s = time.perf_counter() - t0
+    mem_mb = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+
+    rng = random.Random(1)
+    sample = [rng.choice(generics) for _ in range(args.queries)]
+    exact = [f"what is the dose of {g} for adults?" for g in sample]
+    # real generic/brand names are long; very short synthetic names are too ambiguous to typo-test
+    long_sample = [g for g in sample if len(g) >= 8]
+    typo_words = [_typo(rng, g) for g in long_sample]
+    typo = [f"what is the dose of {t} for adults?" for t in typo_words]
+    miss = ["what should I eat to avoid eczema flare ups?"] * args.queries
+
+    print(f"entries={len(index)} fuzzy_words={len(index.fuzzy_words)} build={build_s:.1f}s memory={mem_mb:.0f}MB")
+    for label, prompts, fn in [("mention (exact)", exact, index.lookup), ("mention (typo)", typo, index.lookup),
+                               ("no medicine", miss, index.lookup), ("trie only", exact, index.find_mentions)]:
+        p50, p99 = _time_us(fn, prompts)
+        print(f"{label:16s} p50={p50:8.1f}us  p99={p99:8.1f}us")
+    # the synthetic name space is dense, so a typo is often equally close to several names;
+    # count a hit when the intended medicine is among the top 3 candidates
+    hits = sum(1 for g, t in zip(long_sample, typo_words)
+               if any(index.generics[e] == g for e, _, _ in index.fuzzy_lookup(t, limit=3)))
+    print(f"typo recall@3: {hits / len(typo_words):.1%} over {len(typo_words)} one-character typos")
@@ -0,0 +1,105 @@
+# bench_server.py
+# Throughput of `serve.py` for different worker counts, with Gemini replaced by the local stub.
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+QUESTIONS = [
+    "What are common causes of contact dermatitis in India?",
+    "Is nickel allergy common?",
+    "How is urticaria treated?",
+    "Which foods trigger atopic dermatitis in children?",
+    "What is parthenium dermatitis?",
+]
+
+
+def _wait_until_up(url, timeout=180):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"server at {url} did not come up within {timeout}s")
+
+
+def _one_request(base_url, i):
+    t0 = time.perf_counter()
+    r = requests.post(f"{base_url}/api/ask", json={"prompt": QUESTIONS[i % len(QUESTIONS)]}, timeout=120)
+    r.raise_for_status()
+    return time.perf_counter() - t0, bool(r.json().get("degraded"))
+
+
+def run_load(base_url, total, concurrency):
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: _one_request(base_url, i), range(total)))
+    elapsed = time.perf_counter() - t0
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        # degraded replies skip Gemini, so they would make the server look faster than it is
+        "degraded": sum(degraded for _, degraded in results),
+        "rps": round(total / elapsed, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serve.py throughput vs. worker count")
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--stub-latency-ms", type=float, default=200.0)
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--allow-degraded", action="store_true",
+                        help="report degraded replies instead of failing the benchmark")
+    args = parser.parse_args()
+
+    stub_port = args.port + 1
+    stub = subprocess.Popen([sys.executable, "gemini_stub.py", "--port", str(stub_port),
+                             "--latency-ms", str(args.stub_latency_ms)])
+    log_dir = tempfile.mkdtemp(prefix="bench_server_")
+    # the server under test must not shed or throttle the load, serve warm answers, or log
+    # the benchmark questions into the real request log
+    env = dict(os.environ, GEMINI_API_URL=f"http://127.0.0.1:{stub_port}/generate", GEMINI_API_KEY="stub",
+               GEMINI_RPM="1000000", GEMINI_TPM="1000000000", GEMINI_MAX_QUEUE="100000", WARMUP_TOP_N="0",
+               REQUEST_LOG_PATH=os.path.join(log_dir, "requests.jsonl"))
+    base_url = f"http://127.0.0.1:{args.port}"
+    rows = []
+    try:
+        for workers in [int(w) for w in args.workers.split(",")]:
+            server = subprocess.Popen([sys.executable, "serve.py", "--bind", f"127.0.0.1:{args.port}",
+                                       "--workers", str(workers), "--threads", str(args.threads)],
+                                      env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                _wait_until_up(base_url + "/")
+                run_load(base_url, min(20, args.requests), args.concurrency)  # warm every worker
+                result = run_load(base_url, args.requests, args.concurrency)
+            finally:
+                server.terminate()
+                server.wait(timeout=60)
+            rows.append({"workers": workers, "threads": args.threads, **result})
+            print(rows[-1])
+    finally:
+        stub.terminate()
+
+    print("\nworkers\tthreads\treq/s\tp50 ms\tp95 ms\tdegraded")
+    for row in rows:
+        print(f"{row['workers']}\t{row['threads']}\t{row['rps']}\t{row['p50_ms']}\t{row['p95_ms']}\t{row['degraded']}")
+    degraded = sum(row["degraded"] for row in rows)
+    if degraded and not args.allow_degraded:
+        sys.exit(f"{degraded} degraded replies: the numbers above do not measure full answers")
+
+
+if __name__ == "__main__":
+    main()
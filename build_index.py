@@ -1,35 +1,70 @@
 
 import json
-import csv
-import chromadb
 from sentence_transformers import SentenceTransformer
+from index_config import CHROMA_DB_PATH, hnsw_metadata
+from vector_store import get_vector_store
 
-# Load JSON data
-with open("structured_allergy_data.json", "r", encoding="utf-8") as f:
-    json_data = json.load(f)
+BATCH_SIZE = 32
 
-# Load CSV data
-csv_data = []
-with open("structured_allergy_data.csv", "r", encoding="utf-8") as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        # Combine title, summary, and text for richer context
-        text = f"{row.get('title', '')} {row.get('summary', '')} {row.get('text', '')}"
-        csv_data.append(text)
 
-# Combine all texts
-all_texts = [item["text"] for item in json_data] + csv_data
+def load_documents(json_path="structured_allergy_data.json"):
+    """
+    One (id, text) per paper. The CSV written by the pipeline is a copy of the same
+    records, so only the JSON is read; title, summary and text are combined for richer
+    context. Records repeated in the file (same id or same text) are indexed once.
+    """
+    with open(json_path, "r", encoding="utf-8") as f:
+        json_data = json.load(f)
 
-# Create embeddings model
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
+    ids, texts = [], []
+    seen_ids, seen_texts = set(), set()
+    for i, item in enumerate(json_data):
+        doc_id = str(item.get("id") or f"local_{i}")
+        text = f"{item.get('title') or ''} {item.get('summary') or ''} {item.get('text') or ''}"
+        key = " ".join(text.lower().split())
+        if doc_id in seen_ids or key in seen_texts or not key:
+            continue
+        seen_ids.add(doc_id)
+        seen_texts.add(key)
+        ids.append(doc_id)
+        texts.append(text)
+    return ids, texts
 
-# Initialize Chroma
-client = chromadb.PersistentClient(path="./chroma_db")
-collection = client.get_or_create_collection("allergy")
 
-# Insert docs
-for i, text in enumerate(all_texts):
-    emb = embedder.encode(text).tolist()
-    collection.add(documents=[text], embeddings=[emb], ids=[str(i)])
+def build(collection_name="allergy", persist_dir=CHROMA_DB_PATH, backend=None, progress=None):
+    """
+    Embed the dataset and store it in `collection_name`. `progress(done, total)` is
+    called after every batch. Rebuilding an existing collection replaces its documents and
+    removes the ones no longer in the dataset. Returns (store, ids, texts) so callers can validate the result.
+    """
+    all_ids, all_texts = load_documents()
 
-print("✅ Combined dataset stored in ChromaDB")
+    # Create embeddings model
+    embedder = SentenceTransformer("all-MiniLM-L6-v2")
+
+    # Initialize the vector store (Chroma unless VECTOR_BACKEND=numpy)
+    # HNSW settings only apply when the collection is created; delete it to re-tune an existing index
+    # (versioned collections built by index_jobs.py share the settings of their base collection)
+    base_name = collection_name.split("__v")[0]
+    store = get_vector_store(collection_name, persist_dir, backend=backend, create=True,
+                             metadata=hnsw_metadata(base_name))
+
+    # Insert docs
+    for start in range(0, len(all_texts), BATCH_SIZE):
+        batch = all_texts[start:start + BATCH_SIZE]
+        embeddings = embedder.encode(batch, batch_size=BATCH_SIZE)
+        # upsert: rerunning the build over an existing collection replaces documents instead of duplicating them
+        store.upsert(ids=all_ids[start:start + len(batch)], embeddings=embeddings, documents=batch)
+        if progress:
+            progress(start + len(batch), len(all_texts))
+    # documents from an earlier build that are no longer in the dataset (e.g. the old CSV copies)
+    stale = set(store.list_ids()) - set(all_ids)
+    if stale:
+        store.delete(sorted(stale))
+    store.persist()
+    return store, all_ids, all_texts
+
+
+if __name__ == "__main__":
+    build("allergy")
+    print("✅ Combined dataset stored in the vector store")
@@ -0,0 +1,236 @@
+# dedupe.py
+# Entity resolution across sources: the same paper found by Semantic Scholar and PubMed
+# (or twice by one source) is merged into one canonical record that keeps its provenance.
+# Matching runs in order: DOI / PMID / Semantic Scholar id, normalized title, then
+# MinHash-LSH near-duplicate detection on abstracts.
+import re
+import zlib
+import unicodedata
+from collections import defaultdict
+import numpy as np
+
+MINHASH_PERMUTATIONS = 128
+# 32 bands x 4 rows: abstracts with Jaccard similarity above ~0.45 share a bucket with high probability
+LSH_BANDS = 32
+# estimated Jaccard similarity of abstract shingles needed to call two records the same paper
+NEAR_DUPLICATE_THRESHOLD = 0.7
+SHINGLE_WORDS = 3
+# shorter abstracts (or titles) are too generic to match on
+MIN_ABSTRACT_WORDS = 40
+MIN_TITLE_CHARS = 20
+# field values are taken from the first source in this order that has them
+SOURCE_PRIORITY = ("pubmed", "semantic_scholar")
+
+_SOURCE_ID_KIND = {"pubmed": "pmid", "semantic_scholar": "paperId"}
+_PRIME = 4294967311  # smallest prime above 2**32
+_rng = np.random.default_rng(12345)
+_HASH_A = _rng.integers(1, 2**32 - 1, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_HASH_B = _rng.integers(0, 2**32 - 1, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+
+def normalize_doi(doi):
+    doi = (doi or "").strip().lower()
+    doi = re.sub(r"^(https?://(dx\.)?doi\.org/|doi:\s*)", "", doi)
+    return doi or None
+
+
+def normalize_title(title):
+    """Lowercase ASCII words only: ignores case, accents, punctuation and a trailing period."""
+    text = unicodedata.normalize("NFKD", title or "").encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def record_ids(rec):
+    """Identifier keys of a record: (kind, value) pairs for DOI, PMID and Semantic Scholar id."""
+    ext = rec.get("externalIds") or {}
+    keys = []
+    doi = normalize_doi(rec.get("doi") or ext.get("DOI"))
+    if doi:
+        keys.append(("doi", doi))
+    pmid = str(rec.get("pmid") or ext.get("PubMed") or "").strip()
+    if pmid:
+        keys.append(("pmid", pmid))
+    if rec.get("paperId"):
+        keys.append(("paperId", rec["paperId"]))
+    # canonical records also carry the ids of the copies they were merged from
+    for entry in rec.get("sources") or []:
+        kind = _SOURCE_ID_KIND.get(entry.get("source"))
+        if kind and entry.get("id") and (kind, str(entry["id"])) not in keys:
+            keys.append((kind, str(entry["id"])))
+    return keys
+
+
+def _year(rec):
+    try:
+        return int(str(rec.get("year") or "")[:4])
+    except ValueError:
+        return None
+
+
+def _shingles(text):
+    words = re.findall(r"[a-z0-9]+", (text or "").lower())
+    if len(words) < MIN_ABSTRACT_WORDS:
+        return None
+    grams = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash(text):
+    """MinHash signature of the word shingles of `text`, or None if it is too short to compare."""
+    shingles = _shingles(text)
+    if shingles is None:
+        return None
+    # a*x + b stays below 2**64 for 32-bit inputs, so uint64 arithmetic does not wrap
+    return ((_HASH_A[:, None] * shingles[None, :] + _HASH_B[:, None]) % _PRIME).min(axis=1)
+
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        ri, rj = self.find(i), self.find(j)
+        if ri == rj:
+            return False
+        # keep the lower index as root so the canonical order follows the input order
+        self.parent[max(ri, rj)] = min(ri, rj)
+        return True
+
+
+def find_duplicates(records):
+    """
+    Group records that describe the same paper. Returns (groups, reasons): groups are
+    lists of record indices in input order, reasons maps a group's first index to the
+    rules that merged it ("doi", "pmid", "paperId", "title", "abstract").
+    """
+    uf = _UnionFind(len(records))
+    reasons = defaultdict(set)
+
+    def link(i, j, reason):
+        if uf.union(i, j):
+            reasons[(i, j)].add(reason)
+
+    # 1. shared identifiers
+    first_with = {}
+    for i, rec in enumerate(records):
+        for key in record_ids(rec):
+            if key in first_with:
+                link(first_with[key], i, key[0])
+            else:
+                first_with[key] = i
+
+    # 2. same normalized title, published within a year of each other (epub vs print dates)
+    by_title = defaultdict(list)
+    for i, rec in enumerate(records):
+        title = normalize_title(rec.get("title"))
+        if len(title) >= MIN_TITLE_CHARS:
+            by_title[title].append(i)
+    for indices in by_title.values():
+        for j in indices[1:]:
+            for i in indices[:indices.index(j)]:
+                yi, yj = _year(records[i]), _year(records[j])
+                if yi is None or yj is None or abs(yi - yj) <= 1:
+                    link(i, j, "title")
+                    break
+
+    # 3. near-duplicate abstracts: LSH buckets propose pairs, the signature estimate confirms them
+    signatures = {i: sig for i, sig in ((i, minhash(rec.get("abstract"))) for i, rec in enumerate(records))
+                  if sig is not None}
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    buckets = defaultdict(list)
+    for i, sig in signatures.items():
+        for band in range(LSH_BANDS):
+            buckets[(band, sig[band * rows:(band + 1) * rows].tobytes())].append(i)
+    checked = set()
+    for members in buckets.values():
+        for a in range(len(members)):
+            for b in range(a + 1, len(members)):
+                i, j = members[a], members[b]
+                if (i, j) in checked or uf.find(i) == uf.find(j):
+                    continue
+                checked.add((i, j))
+                if np.mean(signatures[i] == signatures[j]) >= NEAR_DUPLICATE_THRESHOLD:
+                    link(i, j, "abstract")
+
+    groups = defaultdict(list)
+    for i in range(len(records)):
+        groups[uf.find(i)].append(i)
+    group_reasons = defaultdict(set)
+    for (i, _), why in reasons.items():
+        group_reasons[uf.find(i)] |= why
+    return list(groups.values()), {root: sorted(why) for root, why in group_reasons.items()}
+
+
+def _source_rank(rec):
+    source = rec.get("source")
+    return SOURCE_PRIORITY.index(source) if source in SOURCE_PRIORITY else len(SOURCE_PRIORITY)
+
+
+def merge_group(group):
+    """One canonical record from records of the same paper, with a `sources` provenance list."""
+    ordered = sorted(group, key=_source_rank)
+    merged = {}
+    for rec in ordered:
+        for key, value in rec.items():
+            if value not in (None, "", [], {}) and merged.get(key) in (None, "", [], {}):
+                merged[key] = value
+    # the fullest abstract wins; identifiers from every source are kept
+    abstracts = [rec.get("abstract") or "" for rec in ordered]
+    merged["abstract"] = max(abstracts, key=len) or None
+    ext = {}
+    for rec in reversed(ordered):
+        ext.update(rec.get("externalIds") or {})
+    if ext:
+        merged["externalIds"] = ext
+    for kind, value in sorted({key for rec in ordered for key in record_ids(rec)}):
+        merged.setdefault(kind, value)
+    merged["source"] = ordered[0].get("source")
+    merged["sources"] = []
+    for rec in ordered:
+        entry = {"source": rec.get("source"), "id": rec.get("paperId") or rec.get("pmid") or rec.get("id")}
+        if entry not in merged["sources"]:
+            merged["sources"].append(entry)
+    return merged
+
+
+def dedupe_records(records):
+    """Merge duplicate records. Returns (canonical records in input order, stats)."""
+    groups, reasons = find_duplicates(records)
+    canonical = []
+    stats = defaultdict(int)
+    for group in groups:
+        merged = merge_group([records[i] for i in group])
+        if len(group) > 1:
+            merged["merged_by"] = reasons.get(group[0], [])
+            stats["merged_groups"] += 1
+            for reason in merged["merged_by"]:
+                stats[f"by_{reason}"] += 1
+        canonical.append(merged)
+    stats["input"] = len(records)
+    stats["output"] = len(canonical)
+    return canonical, dict(stats)
+
+
+def match_existing(records, existing):
+    """
+    For each of `records`, the id of the paper in `existing` (an already processed corpus)
+    that it matches by identifier or normalized title, or None for a new paper.
+    """
+    owner = {}
+    for rec in existing:
+        title = normalize_title(rec.get("title"))
+        keys = record_ids(rec) + ([("title", title)] if len(title) >= MIN_TITLE_CHARS else [])
+        for key in keys:
+            owner.setdefault(key, rec["id"])
+    matches = []
+    for rec in records:
+        title = normalize_title(rec.get("title"))
+        keys = record_ids(rec) + ([("title", title)] if len(title) >= MIN_TITLE_CHARS else [])
+        matches.append(next((owner[key] for key in keys if key in owner), None))
+    return matches
@@ -0,0 +1,284 @@
+# feature_store.py
+# Compact, array-backed store for the features extracted by nlp_extract.py.
+# Lexicon terms are interned to integer ids; for each field, every term owns a packed
+# bitset over documents, so corpus queries ("nickel in Kerala") are vectorized ANDs.
+# Per-document term lists are kept as CSR arrays to rebuild records on demand.
+import sys
+import json
+import argparse
+import numpy as np
+
+TERM_FIELDS = ("conditions", "allergens", "food_triggers", "regions")
+# bits set in each byte value, for counting documents in a packed bitset
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class Lexicon:
+    """Term <-> integer id for one field. Lookups ignore case; terms keep their first spelling."""
+
+    def __init__(self, terms=()):
+        self.terms = []
+        self._ids = {}
+        for term in terms:
+            self.add(term)
+
+    def add(self, term):
+        key = term.lower()
+        if key not in self._ids:
+            self._ids[key] = len(self.terms)
+            self.terms.append(sys.intern(term))
+        return self._ids[key]
+
+    def id(self, term):
+        """Term id, or None if no document mentions the term."""
+        return self._ids.get(term.lower())
+
+    def __len__(self):
+        return len(self.terms)
+
+
+class PaperFeatures:
+    """One record read back from the store; term lists share the lexicon's interned strings."""
+    __slots__ = ("id", "title", "year", "source") + TERM_FIELDS + ("prevalence_percent",)
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"PaperFeatures(id={self.id!r}, title={self.title!r})"
+
+
+class FeatureStore:
+    """
+    Column-oriented features for `n` documents:
+      - ids, titles, sources (interned): Python lists; years: int16 (0 = unknown);
+      - per term field: a Lexicon, CSR arrays (indptr, term ids) per document, and a
+        (n_terms, ceil(n / 8)) uint8 matrix of packed document bitsets per term;
+      - prevalence figures: CSR (indptr, float32 values).
+    """
+
+    def __init__(self):
+        self.ids = []
+        self.titles = []
+        self.sources = []
+        self.years = np.zeros(0, dtype=np.int16)
+        self.lexicons = {field: Lexicon() for field in TERM_FIELDS}
+        self.indptr = {field: np.zeros(1, dtype=np.int32) for field in TERM_FIELDS}
+        self.term_ids = {field: np.zeros(0, dtype=np.uint16) for field in TERM_FIELDS}
+        self.bitsets = {field: np.zeros((0, 0), dtype=np.uint8) for field in TERM_FIELDS}
+        self.prevalence_indptr = np.zeros(1, dtype=np.int32)
+        self.prevalence = np.zeros(0, dtype=np.float32)
+        self._positions = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_records(cls, records):
+        """Build from extractor records (dicts with the fields of structured_allergy_data.json)."""
+        store = cls()
+        n = len(records)
+        store.ids = [str(rec.get("id") or f"local_{i}") for i, rec in enumerate(records)]
+        store.titles = [rec.get("title") or "" for rec in records]
+        store.sources = [sys.intern(rec.get("source") or "") for rec in records]
+        store.years = np.array([_year(rec.get("year")) for rec in records], dtype=np.int16)
+        for field in TERM_FIELDS:
+            lexicon = store.lexicons[field]
+            indptr, term_ids = [0], []
+            for rec in records:
+                # a document mentions each term once, in first-seen order
+                doc_terms = dict.fromkeys(lexicon.add(term) for term in rec.get(field) or [])
+                term_ids.extend(doc_terms)
+                indptr.append(len(term_ids))
+            store.indptr[field] = np.array(indptr, dtype=np.int32)
+            store.term_ids[field] = np.array(term_ids, dtype=np.uint16)
+            dense = np.zeros((len(lexicon), n), dtype=bool)
+            rows = np.repeat(np.arange(n), np.diff(store.indptr[field]))
+            dense[store.term_ids[field], rows] = True
+            store.bitsets[field] = np.packbits(dense, axis=1)
+        values = [[float(v) for v in rec.get("prevalence_percent") or []] for rec in records]
+        store.prevalence_indptr = np.cumsum([0] + [len(v) for v in values], dtype=np.int32)
+        store.prevalence = np.array([v for vs in values for v in vs], dtype=np.float32)
+        store._positions = {doc_id: i for i, doc_id in enumerate(store.ids)}
+        return store
+
+    # --- queries ---
+
+    def _all(self):
+        return np.packbits(np.ones(len(self), dtype=bool))
+
+    def term_mask(self, field, term):
+        """Packed bitset of documents whose `field` contains `term` (all zeros for an unknown term)."""
+        term_id = self.lexicons[field].id(term)
+        if term_id is None:
+            return np.zeros_like(self._all())
+        return self.bitsets[field][term_id]
+
+    def mask(self, match_any=False, year_from=None, year_to=None, **terms):
+        """
+        Packed bitset of documents matching every (or with `match_any`, any) term given as
+        field=[terms], e.g. mask(allergens=["nickel"], regions=["Kerala"]). Terms within
+        one field are alternatives; fields are combined with AND (OR with `match_any`).
+        """
+        result = None
+        for field, wanted in terms.items():
+            if field not in self.lexicons:
+                raise ValueError(f"Unknown feature field: {field}")
+            if isinstance(wanted, str):
+                wanted = [wanted]
+            field_mask = np.zeros_like(self._all())
+            for term in wanted:
+                field_mask |= self.term_mask(field, term)
+            if result is None:
+                result = field_mask
+            else:
+                result = (result | field_mask) if match_any else (result & field_mask)
+        if result is None:
+            result = self._all()
+        if year_from or year_to:
+            years = self.years
+            in_range = (years >= (year_from or 1)) & (years <= (year_to or np.iinfo(np.int16).max))
+            result = result & np.packbits(in_range)
+        return result
+
+    def query(self, **criteria):
+        """Indices of matching documents (see `mask`)."""
+        return np.flatnonzero(np.unpackbits(self.mask(**criteria), count=len(self)))
+
+    def count(self, **criteria):
+        return int(_POPCOUNT[self.mask(**criteria)].sum())
+
+    def term_counts(self, field, **criteria):
+        """{term: number of matching documents mentioning it}, most frequent first."""
+        selected = self.mask(**criteria)
+        counts = _POPCOUNT[self.bitsets[field] & selected].sum(axis=1, dtype=np.int64)
+        order = np.argsort(-counts, kind="stable")
+        return {self.lexicons[field].terms[i]: int(counts[i]) for i in order if counts[i]}
+
+    # --- records ---
+
+    def terms(self, field, i):
+        start, end = self.indptr[field][i], self.indptr[field][i + 1]
+        lexicon = self.lexicons[field].terms
+        return [lexicon[t] for t in self.term_ids[field][start:end]]
+
+    def get(self, i):
+        """Record `i` (an index, or an id string) as a slotted PaperFeatures."""
+        if isinstance(i, str):
+            i = self._positions[i]
+        start, end = self.prevalence_indptr[i], self.prevalence_indptr[i + 1]
+        return PaperFeatures(
+            id=self.ids[i], title=self.titles[i], year=int(self.years[i]) or None, source=self.sources[i],
+            prevalence_percent=[round(float(v), 2) for v in self.prevalence[start:end]],
+            **{field: self.terms(field, i) for field in TERM_FIELDS})
+
+    def nbytes(self):
+        """Approximate memory held by the store (arrays plus string objects)."""
+        arrays = [self.years, self.prevalence_indptr, self.prevalence]
+        for field in TERM_FIELDS:
+            arrays += [self.indptr[field], self.term_ids[field], self.bitsets[field]]
+        strings = sum(sys.getsizeof(s) for s in self.ids + self.titles)
+        strings += sum(sys.getsizeof(t) for lexicon in self.lexicons.values() for t in lexicon.terms)
+        lists = sum(sys.getsizeof(lst) for lst in (self.ids, self.titles, self.sources))
+        return sum(a.nbytes for a in arrays) + strings + lists
+
+    # --- persistence ---
+
+    def save(self, path):
+        arrays = {"years": self.years, "prevalence_indptr": self.prevalence_indptr, "prevalence": self.prevalence}
+        for field in TERM_FIELDS:
+            arrays[f"{field}_indptr"] = self.indptr[field]
+            arrays[f"{field}_term_ids"] = self.term_ids[field]
+            arrays[f"{field}_bitsets"] = self.bitsets[field]
+        header = {"ids": self.ids, "titles": self.titles, "sources": self.sources,
+                  "lexicons": {field: self.lexicons[field].terms for field in TERM_FIELDS}}
+        arrays["header"] = np.frombuffer(json.dumps(header, ensure_ascii=False).encode("utf-8"), dtype=np.uint8)
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        store = cls()
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(data["header"].tobytes().decode("utf-8"))
+            store.ids = header["ids"]
+            store.titles = header["titles"]
+            store.sources = [sys.intern(s) for s in header["sources"]]
+            store.years = data["years"]
+            store.prevalence_indptr = data["prevalence_indptr"]
+            store.prevalence = data["prevalence"]
+            for field in TERM_FIELDS:
+                store.lexicons[field] = Lexicon(header["lexicons"][field])
+                store.indptr[field] = data[f"{field}_indptr"]
+                store.term_ids[field] = data[f"{field}_term_ids"]
+                store.bitsets[field] = data[f"{field}_bitsets"]
+        store._positions = {doc_id: i for i, doc_id in enumerate(store.ids)}
+        return store
+
+
+def _year(value):
+    try:
+        return int(str(value or "")[:4])
+    except ValueError:
+        return 0
+
+
+def _dict_nbytes(records):
+    """Memory of the same features held as one dict of lists per record (for comparison)."""
+    fields = ("id", "title", "year", "source") + TERM_FIELDS + ("prevalence_percent",)
+    total = 0
+    for rec in records:
+        feats = {name: rec.get(name) for name in fields}
+        total += sys.getsizeof(feats)
+        for value in feats.values():
+            total += sys.getsizeof(value)
+            if isinstance(value, list):
+                total += sum(sys.getsizeof(v) for v in value)
+    return total
+
+
+def build_feature_store(records, path="structured_allergy_features.npz"):
+    """Build the compact store from extractor records and save it next to the CSV/JSON outputs."""
+    store = FeatureStore.from_records(records)
+    store.save(path)
+    print(f"Saved features of {len(store)} records to {path} ({store.nbytes() / 1024:.1f} KB in memory)")
+    return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the compact feature store")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build", help="build the store from the structured JSON dataset")
+    p_build.add_argument("--input", default="structured_allergy_data.json")
+    p_build.add_argument("--out", default="structured_allergy_features.npz")
+    p_query = sub.add_parser("query", help='e.g. query --allergen nickel --region Kerala')
+    p_query.add_argument("--store", default="structured_allergy_features.npz")
+    p_query.add_argument("--condition", action="append")
+    p_query.add_argument("--allergen", action="append")
+    p_query.add_argument("--food", action="append")
+    p_query.add_argument("--region", action="append")
+    p_query.add_argument("--any", action="store_true", help="match any field instead of all of them")
+    p_query.add_argument("--year-from", type=int)
+    p_query.add_argument("--year-to", type=int)
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        with open(args.input, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        store = build_feature_store(records, args.out)
+        print(f"The same features as dicts: {_dict_nbytes(records) / 1024:.1f} KB")
+    else:
+        store = FeatureStore.load(args.store)
+        terms = {field: values for field, values in (("conditions", args.condition), ("allergens", args.allergen),
+                                                     ("food_triggers", args.food), ("regions", args.region))
+                 if values}
+        hits = store.query(match_any=args.any, year_from=args.year_from, year_to=args.year_to, **terms)
+        print(f"{len(hits)} matching papers")
+        for i in hits[:20]:
+            rec = store.get(int(i))
+            print(f"- [{rec.id}] {rec.title} ({rec.year})")
+        print("Allergens among them:", store.term_counts("allergens", match_any=args.any, year_from=args.year_from,
+                                                         year_to=args.year_to, **terms))
@@ -9,9 +9,12 @@ Entrez.email = "techtimesminatipid01@gmail.com"
 
 SEMANTIC_SCHOLAR_SEARCH = "https://api.semanticscholar.org/graph/v1/paper/search"
 
-def fetch_semantic_scholar(query, limit=100, fields="title,abstract,year,authors,externalIds,url,venue"):
+def fetch_semantic_scholar(query, limit=100, fields="title,abstract,year,authors,externalIds,url,venue", min_year=None):
+    """`min_year`: only papers published in or after this year (incremental sync)."""
     results = []
     params = {"query": query, "limit": min(limit, 100), "fields": fields}
+    if min_year:
+        params["year"] = f"{min_year}-"
     # Semantic Scholar free tier rate-limits; do not hammer
     resp = requests.get(SEMANTIC_SCHOLAR_SEARCH, params=params)
     resp.raise_for_status()
@@ -30,11 +33,16 @@ def fetch_semantic_scholar(query, limit=100, fields="title,abstract,year,authors
         })
     return results
 
-def fetch_pubmed(query, retmax=100):
-    """Use Entrez to search PubMed and fetch metadata + links (2015-2025)"""
-    # restrict to 2015-2025 in query
-    q = f"({query}) AND (2015:2025[dp])"
-    handle = Entrez.esearch(db="pubmed", term=q, retmax=retmax)
+def fetch_pubmed(query, retmax=100, mindate="2015", maxdate=None, datetype="pdat"):
+    """
+    Use Entrez to search PubMed and fetch metadata + links.
+    By default papers published from 2015 to the current year; incremental sync passes
+    datetype="mdat" and the last run's date to get only records added or changed since.
+    Dates are YYYY, YYYY/MM or YYYY/MM/DD.
+    """
+    maxdate = maxdate or time.strftime("%Y/%m/%d")
+    handle = Entrez.esearch(db="pubmed", term=query, retmax=retmax, datetype=datetype,
+                            mindate=mindate, maxdate=maxdate)
     record = Entrez.read(handle)
     ids = record["IdList"]
     papers = []
@@ -42,7 +50,17 @@ def fetch_pubmed(query, retmax=100):
         handle = Entrez.efetch(db="pubmed", id=pmid, retmode="xml")
         rec = Entrez.read(handle)
         try:
-            article = rec['PubmedArticle'][0]['MedlineCitation']['Article']
+            citation = rec['PubmedArticle'][0]['MedlineCitation']
+            article = citation['Article']
+            # retracted papers are dropped from the corpus; a retraction notice names the paper it retracts
+            pub_types = [str(t) for t in article.get('PublicationTypeList', [])]
+            retracts = [str(c['PMID']) for c in citation.get('CommentsCorrectionsList', [])
+                        if getattr(c, 'attributes', {}).get('RefType') == 'RetractionOf' and c.get('PMID')]
+            # the DOI lets dedupe.py match this record with its Semantic Scholar copy
+            doi = ''
+            for aid in rec['PubmedArticle'][0].get('PubmedData', {}).get('ArticleIdList', []):
+                if getattr(aid, 'attributes', {}).get('IdType') == 'doi':
+                    doi = str(aid)
             title = article.get('ArticleTitle', '')
             abstract = ''
             if article.get('Abstract'):
@@ -59,10 +77,13 @@ def fetch_pubmed(query, retmax=100):
             papers.append({
                 "source": "pubmed",
                 "pmid": pmid,
+                "doi": doi,
                 "title": title,
                 "abstract": abstract,
                 "year": year,
                 "authors": authors,
+                "retracted": "Retracted Publication" in pub_types,
+                "retracts": retracts,
             })
         except Exception as e:
             # skip problematic records
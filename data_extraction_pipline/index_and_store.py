@@ -1,10 +1,15 @@
 # index_and_store.py
+import sys
 import json
 from pathlib import Path
 from sentence_transformers import SentenceTransformer
-import chromadb
 from tqdm import tqdm
 
+# index settings and vector stores are shared with the serving app (modules in the repo root)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from index_config import hnsw_metadata  # noqa: E402
+from vector_store import get_vector_store  # noqa: E402
+
 EMBED_MODEL = "all-MiniLM-L6-v2"
 BATCH_SIZE = 32  # reduce if low memory
 
@@ -47,70 +52,66 @@ def build_structured_dataset(records, output_csv="structured_allergy_data.csv",
     return records
 
 
-def index_into_chroma(records, collection_name="indian_skin_allergy", persist_dir="./chroma_db"):
+def index_into_chroma(records, collection_name="indian_skin_allergy", persist_dir="./chroma_db", backend=None):
     """
-    Index structured dataset into ChromaDB (PersistentClient).
+    Index structured dataset into the vector store (ChromaDB PersistentClient by default,
+    or the NumPy store with backend="numpy" / VECTOR_BACKEND=numpy).
     `records`: list of dicts where each dict contains 'title', 'summary' or 'abstract' or 'text'.
+    Documents are upserted by id, so reruns and incremental syncs replace them instead of adding copies.
     """
     # ensure the directory exists
     Path(persist_dir).mkdir(parents=True, exist_ok=True)
 
-    # initialize embedder and chroma client (no heavy work at import time)
+    # initialize embedder and vector store (no heavy work at import time)
     embedder = SentenceTransformer(EMBED_MODEL)
-    client = chromadb.PersistentClient(path=persist_dir)
-
-    # create or get collection
-    collection = client.get_or_create_collection(name=collection_name)
-
-    ids_batch = []
-    docs_batch = []
-    metas_batch = []
-    embs_batch = []
+    store = get_vector_store(collection_name, persist_dir, backend=backend, create=True,
+                             metadata=hnsw_metadata(collection_name))
 
     total = len(records)
-    print(f"Indexing {total} records to Chroma collection '{collection_name}' in {persist_dir}")
-
-    for i, rec in enumerate(tqdm(records)):
-        doc_text = rec.get("summary") or rec.get("abstract") or rec.get("text") or ""
-        doc_id = rec.get("id") or f"doc_{i}"
-
-        metadata_raw = {
-            "title": rec.get("title", ""),
-            "year": rec.get("year", ""),
-            "authors": rec.get("authors", []),
-            "source": rec.get("source", ""),
-            "allergens": rec.get("allergens", []),
-            "food_triggers": rec.get("food_triggers", []),
-            "regions": rec.get("regions", []),
-            "prevalence_percent": rec.get("prevalence_percent", [])
-        }
-
-        metadata = _sanitize_metadata(metadata_raw)
-
-        emb = embedder.encode(doc_text).tolist()
-
-        ids_batch.append(str(doc_id))
-        docs_batch.append(doc_text)
-        metas_batch.append(metadata)
-        embs_batch.append(emb)
-
-        if len(ids_batch) >= BATCH_SIZE or i == total - 1:
-            collection.add(
-                ids=ids_batch,
-                documents=docs_batch,
-                metadatas=metas_batch,
-                embeddings=embs_batch
-            )
-            ids_batch.clear()
-            docs_batch.clear()
-            metas_batch.clear()
-            embs_batch.clear()
-
-    # persist (PersistentClient usually persists automatically)
-    try:
-        client.persist()
-    except Exception:
-        pass
+    print(f"Indexing {total} records to collection '{collection_name}' in {persist_dir}")
+
+    for start in tqdm(range(0, total, BATCH_SIZE)):
+        batch = records[start:start + BATCH_SIZE]
+        ids_batch = []
+        docs_batch = []
+        metas_batch = []
+        for i, rec in enumerate(batch, start=start):
+            doc_text = rec.get("summary") or rec.get("abstract") or rec.get("text") or ""
+            doc_id = rec.get("id") or f"doc_{i}"
+
+            metadata_raw = {
+                "title": rec.get("title", ""),
+                "year": rec.get("year", ""),
+                "authors": rec.get("authors", []),
+                "source": rec.get("source", ""),
+                "sources": rec.get("sources", []),
+                "doi": rec.get("doi"),
+                "allergens": rec.get("allergens", []),
+                "food_triggers": rec.get("food_triggers", []),
+                "regions": rec.get("regions", []),
+                "prevalence_percent": rec.get("prevalence_percent", [])
+            }
+
+            ids_batch.append(str(doc_id))
+            docs_batch.append(doc_text)
+            metas_batch.append(_sanitize_metadata(metadata_raw))
+
+        # one encode call per batch instead of per document
+        embs_batch = embedder.encode(docs_batch, batch_size=BATCH_SIZE)
+        store.upsert(ids=ids_batch, embeddings=embs_batch, documents=docs_batch, metadatas=metas_batch)
+
+    # Chroma persists automatically; the NumPy store writes its matrix here
+    store.persist()
 
     print(f"✅ Completed indexing {total} records.")
-    return True
\ No newline at end of file
+    return True
+
+
+def remove_from_index(ids, collection_name="indian_skin_allergy", persist_dir="./chroma_db", backend=None):
+    """Delete documents by id (e.g. retracted papers) from an existing collection."""
+    if not ids:
+        return
+    store = get_vector_store(collection_name, persist_dir, backend=backend)
+    store.delete([str(i) for i in ids])
+    store.persist()
+    print(f"Removed {len(ids)} records from collection '{collection_name}'")
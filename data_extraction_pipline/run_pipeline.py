@@ -1,86 +1,243 @@
 # run_pipeline.py
+# Full run:        python run_pipeline.py
+# Incremental run: python run_pipeline.py --incremental  (only papers new or changed since the last run)
 import os
 import json
 import time
+import hashlib
+import argparse
 from fetchers import fetch_semantic_scholar, fetch_pubmed
 from pdf_utils import download_pdf, extract_text_from_pdf
 from nlp_extract import extract_features_from_doc
-from index_and_store import build_structured_dataset, index_into_chroma
+from index_and_store import build_structured_dataset, index_into_chroma, remove_from_index
+from feature_store import build_feature_store
+from dedupe import dedupe_records, match_existing, normalize_title
+from sync_state import load_state, save_state, watermark, changed, mark_seen, advance
 from tqdm import tqdm
 
-# 1. Fetch metadata lists (example queries)
-query = "skin allergy India OR contact dermatitis India OR urticaria India OR atopic dermatitis India"
-ss_results = fetch_semantic_scholar(query, limit=100)
-pm_results = fetch_pubmed("skin allergy India", retmax=100)
-
-# merge sources into unified list
-records = []
-# convert Semantic Scholar results to unified doc format
-for r in ss_results:
-    records.append({
-        "title": r.get("title"),
-        "abstract": r.get("abstract"),
-        "year": r.get("year"),
-        "authors": r.get("authors"),
-        "source": "semantic_scholar",
-        "url": r.get("url"),
-        "paperId": r.get("paperId"),
-        "externalIds": r.get("externalIds", {})
-    })
-
-# convert PubMed results
-for r in pm_results:
-    records.append({
-        "title": r.get("title"),
-        "abstract": r.get("abstract"),
-        "year": r.get("year"),
-        "authors": r.get("authors"),
-        "source": "pubmed",
-        "pmid": r.get("pmid")
-    })
-
-# 2. Try to download PDFs where a direct URL exists (Semantic Scholar often has)
-enriched = []
-for rec in tqdm(records, desc="Downloading PDFs (if available)"):
-    fulltext = None
-    url = rec.get("url") or ""
-    # Try direct PDF link heuristic
-    try:
-        if url and (url.lower().endswith(".pdf") or "pdf" in url.lower()):
-            path = download_pdf(url)
-            if path:
-                fulltext = extract_text_from_pdf(path, max_pages=40)
-        else:
-            # try checking externalIds or other heuristics (if available)
-            ext = rec.get("externalIds") or {}
-            # some records may include a PDF link under 'PDF' or have an arXiv id
-            pdf_link = ext.get("PDF") or None
-            if pdf_link:
-                path = download_pdf(pdf_link)
+# example queries
+SS_QUERY = "skin allergy India OR contact dermatitis India OR urticaria India OR atopic dermatitis India"
+PUBMED_QUERY = "skin allergy India"
+OUTPUT_CSV = "structured_allergy_data.csv"
+OUTPUT_JSON = "structured_allergy_data.json"
+OUTPUT_FEATURES = "structured_allergy_features.npz"
+
+
+def fetch_records(state, incremental=False):
+    """
+    1. Fetch metadata lists and merge them into the unified doc format.
+    Incremental runs ask each source only for items past its watermark and keep the
+    ones that are new or changed. Returns (records, PMIDs of retracted papers).
+    """
+    ss_mark = watermark(state, "semantic_scholar", SS_QUERY)
+    pm_mark = watermark(state, "pubmed", PUBMED_QUERY)
+    if incremental and ss_mark["last_year"]:
+        ss_results = fetch_semantic_scholar(SS_QUERY, limit=100, min_year=ss_mark["last_year"])
+    else:
+        ss_results = fetch_semantic_scholar(SS_QUERY, limit=100)
+    if incremental and pm_mark["last_sync"]:
+        # by modification date: new entries and updates (including retractions) since the last run
+        pm_results = fetch_pubmed(f"({PUBMED_QUERY}) AND (2015:3000[dp])", retmax=100,
+                                  mindate=pm_mark["last_sync"], datetype="mdat")
+    else:
+        pm_results = fetch_pubmed(PUBMED_QUERY, retmax=100)
+
+    records = []
+    retracted = set()
+    # convert Semantic Scholar results to unified doc format
+    for r in ss_results:
+        if incremental and not changed(ss_mark, r.get("paperId"), r):
+            continue
+        records.append({
+            "title": r.get("title"),
+            "abstract": r.get("abstract"),
+            "year": r.get("year"),
+            "authors": r.get("authors"),
+            "source": "semantic_scholar",
+            "url": r.get("url"),
+            "paperId": r.get("paperId"),
+            "externalIds": r.get("externalIds", {})
+        })
+
+    # convert PubMed results
+    for r in pm_results:
+        if r.get("retracted"):
+            retracted.add(str(r.get("pmid")))
+        # a retraction notice is not indexed, the paper it names is removed
+        retracted.update(r.get("retracts") or [])
+        if r.get("retracted") or r.get("retracts"):
+            continue
+        if incremental and not changed(pm_mark, r.get("pmid"), r):
+            continue
+        records.append({
+            "title": r.get("title"),
+            "abstract": r.get("abstract"),
+            "year": r.get("year"),
+            "authors": r.get("authors"),
+            "source": "pubmed",
+            "pmid": r.get("pmid"),
+            "doi": r.get("doi")
+        })
+
+    # watermarks are only saved once the run has finished (see main)
+    for mark, results, key in ((ss_mark, ss_results, "paperId"), (pm_mark, pm_results, "pmid")):
+        for r in results:
+            mark_seen(mark, r.get(key), r)
+        advance(mark, results)
+    return records, retracted
+
+
+def download_texts(records):
+    """2. Try to download PDFs where a direct URL exists (Semantic Scholar often has)."""
+    enriched = []
+    for rec in tqdm(records, desc="Downloading PDFs (if available)"):
+        fulltext = None
+        url = rec.get("url") or ""
+        # Try direct PDF link heuristic
+        try:
+            if url and (url.lower().endswith(".pdf") or "pdf" in url.lower()):
+                path = download_pdf(url)
                 if path:
                     fulltext = extract_text_from_pdf(path, max_pages=40)
-    except Exception as e:
-        # don't fail whole run for a single download issue
-        print("PDF download/extract failed for:", rec.get("title"), e)
-    enriched.append({**rec, "text": fulltext})
-    time.sleep(0.1)  # small polite pause
-
-# 3. Extract structured features
-structured = []
-for idx, doc in enumerate(tqdm(enriched, desc="Extracting features")):
-    features = extract_features_from_doc(doc)
-    # attach original metadata and ensure required fields exist
-    features["title"] = doc.get("title") or features.get("title")
-    features["authors"] = doc.get("authors") or features.get("authors", [])
-    features["source"] = doc.get("source") or features.get("source", "")
-    # create a stable unique id: prefer paperId -> pmid -> fallback to sequential idx
-    features["id"] = doc.get("paperId") or doc.get("pmid") or f"local_{idx}"
-    # ensure a text field is present for embeddings/indexing
-    features["text"] = (doc.get("text") or doc.get("abstract") or features.get("summary") or "") 
-    structured.append(features)
-
-# 4. Save CSV/JSON and index into Chroma
-build_structured_dataset(structured, output_csv="structured_allergy_data.csv", output_json="structured_allergy_data.json")
-index_into_chroma(structured, collection_name="indian_skin_allergy", persist_dir="./chroma_db")
-
-print("Pipeline finished. Files saved: structured_allergy_data.csv, structured_allergy_data.json")
+            else:
+                # try checking externalIds or other heuristics (if available)
+                ext = rec.get("externalIds") or {}
+                # some records may include a PDF link under 'PDF' or have an arXiv id
+                pdf_link = ext.get("PDF") or None
+                if pdf_link:
+                    path = download_pdf(pdf_link)
+                    if path:
+                        fulltext = extract_text_from_pdf(path, max_pages=40)
+        except Exception as e:
+            # don't fail whole run for a single download issue
+            print("PDF download/extract failed for:", rec.get("title"), e)
+        enriched.append({**rec, "text": fulltext})
+        time.sleep(0.1)  # small polite pause
+    return enriched
+
+
+def extract_features(enriched):
+    """3. Extract structured features."""
+    structured = []
+    for doc in tqdm(enriched, desc="Extracting features"):
+        features = extract_features_from_doc(doc)
+        # attach original metadata and ensure required fields exist
+        features["title"] = doc.get("title") or features.get("title")
+        features["authors"] = doc.get("authors") or features.get("authors", [])
+        features["source"] = doc.get("source") or features.get("source", "")
+        features["sources"] = doc.get("sources", [])
+        features["doi"] = doc.get("doi")
+        # create a stable unique id: existing id (updates) -> paperId -> pmid -> title hash,
+        # so reruns upsert the same document instead of adding a new one
+        features["id"] = (doc.get("id") or doc.get("paperId") or doc.get("pmid")
+                          or "local_" + hashlib.sha1(normalize_title(doc.get("title")).encode("utf-8")).hexdigest()[:12])
+        # ensure a text field is present for embeddings/indexing
+        features["text"] = (doc.get("text") or doc.get("abstract") or features.get("summary") or "")
+        structured.append(features)
+    return structured
+
+
+def load_corpus(path=OUTPUT_JSON):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def resolve_against_corpus(records, corpus):
+    """
+    Split incremental records into work to do. Returns the records to (re)process --
+    new papers, and updated ones under their existing id -- after recording any new
+    source copy of a known paper as provenance only (nothing to re-embed).
+    """
+    by_id = {rec["id"]: rec for rec in corpus}
+    to_process = []
+    for rec, existing_id in zip(records, match_existing(records, corpus)):
+        if existing_id is None:
+            to_process.append(rec)
+            continue
+        existing = by_id[existing_id]
+        known = existing.get("sources") or [{"source": existing.get("source"), "id": existing_id}]
+        known_keys = {(s.get("source"), str(s.get("id"))) for s in known}
+        new_sources = [s for s in rec["sources"] if (s["source"], str(s["id"])) not in known_keys]
+        if len(new_sources) == len(rec["sources"]):
+            existing["sources"] = known + new_sources
+        else:
+            to_process.append({**rec, "id": existing_id, "sources": known + new_sources})
+    return to_process
+
+
+def retracted_ids(corpus, retracted_pmids):
+    """Corpus ids of papers whose PubMed record (or merged PubMed copy) was retracted."""
+    ids = []
+    for rec in corpus:
+        pmids = {str(s.get("id")) for s in rec.get("sources") or [] if s.get("source") == "pubmed"}
+        if str(rec["id"]) in retracted_pmids or pmids & retracted_pmids:
+            ids.append(rec["id"])
+    return ids
+
+
+def main(incremental=False, collection_name="indian_skin_allergy", persist_dir="./chroma_db", backend=None):
+    state = load_state()
+    # the previous dataset: the base of an incremental run, what a full run replaces
+    corpus = load_corpus()
+    if incremental and not corpus:
+        print("No existing dataset found; running a full sync")
+        incremental = False
+
+    records, retracted = fetch_records(state, incremental)
+    # drop papers found by both sources (or twice by one) before downloading and embedding them
+    records, dedupe_stats = dedupe_records(records)
+    print("Deduplicated records:", dedupe_stats)
+    if incremental:
+        records = resolve_against_corpus(records, corpus)
+
+    structured = extract_features(download_texts(records))
+
+    # 4. Save CSV/JSON and index into Chroma
+    if incremental:
+        removed = set(retracted_ids(corpus, retracted))
+        updated = {rec["id"]: rec for rec in structured}
+        merged = [updated.pop(rec["id"], rec) for rec in corpus if rec["id"] not in removed]
+        merged += [rec for rec in updated.values() if rec["id"] not in removed]
+        build_structured_dataset(merged, output_csv=OUTPUT_CSV, output_json=OUTPUT_JSON)
+        build_feature_store(merged, OUTPUT_FEATURES)
+        structured = [rec for rec in structured if rec["id"] not in removed]
+        if structured:
+            index_into_chroma(structured, collection_name=collection_name, persist_dir=persist_dir,
+                              backend=backend)
+        remove_from_index(sorted(removed), collection_name=collection_name, persist_dir=persist_dir,
+                          backend=backend)
+        print(f"Incremental sync: {len(structured)} new or updated, {len(removed)} retracted, "
+              f"{len(merged)} records in total")
+    else:
+        removed = set(retracted_ids(structured, retracted))
+        structured = [rec for rec in structured if rec["id"] not in removed]
+        build_structured_dataset(structured, output_csv=OUTPUT_CSV, output_json=OUTPUT_JSON)
+        build_feature_store(structured, OUTPUT_FEATURES)
+        index_into_chroma(structured, collection_name=collection_name, persist_dir=persist_dir, backend=backend)
+        # retracted papers an earlier run indexed (PubMed papers are indexed under their PMID),
+        # and papers of the previous dataset that this run no longer has (e.g. merged away by dedupe)
+        kept = {str(rec["id"]) for rec in structured}
+        retracted_before = {str(i) for i in removed | set(retracted_ids(corpus, retracted)) | retracted}
+        gone = {str(rec["id"]) for rec in corpus} - kept
+        remove_from_index(sorted((retracted_before | gone) - kept), collection_name=collection_name,
+                          persist_dir=persist_dir, backend=backend)
+        print(f"Full sync: {len(structured)} records, {len(retracted_before)} retracted, "
+              f"{len(gone - retracted_before)} no longer found")
+    save_state(state)
+
+    print(f"Pipeline finished. Files saved: {OUTPUT_CSV}, {OUTPUT_JSON}, {OUTPUT_FEATURES}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch, process and index allergy papers")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only fetch and process papers new or changed since the last run (sync_state.json)")
+    parser.add_argument("--collection", default="indian_skin_allergy")
+    parser.add_argument("--persist-dir", default="./chroma_db")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], help="defaults to VECTOR_BACKEND")
+    args = parser.parse_args()
+
+    main(incremental=args.incremental, collection_name=args.collection, persist_dir=args.persist_dir,
+         backend=args.backend)
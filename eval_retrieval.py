@@ -0,0 +1,266 @@
+# eval_retrieval.py
+# Offline retrieval evaluation over structured_allergy_data.json: recall@k, MRR and nDCG
+# with weak labels (titles, conditions, allergens), per-query latency and memory.
+# No Gemini calls are made.
+import os
+import json
+import math
+import time
+import random
+import argparse
+import statistics
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+try:
+    import resource  # not available on Windows
+except ImportError:
+    resource = None
+
+DATA_PATH = "structured_allergy_data.json"
+RUNS_DIR = Path("eval/runs")
+# terms shared by too many papers make weak, uninformative labels
+MAX_TERM_DOCS = 30
+
+
+def load_records(path=DATA_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    for i, rec in enumerate(records):
+        rec["id"] = str(rec.get("id") or f"local_{i}")
+    return records
+
+
+def generate_queries(records, seed=0, max_title_queries=None):
+    """
+    Weakly labelled queries:
+      - "title": a paper's title, relevant = papers with that title;
+      - "condition" / "allergen": a lexicon term, relevant = papers tagged with it.
+    """
+    by_title = defaultdict(set)
+    by_term = defaultdict(set)
+    for rec in records:
+        if rec.get("title"):
+            by_title[" ".join(rec["title"].lower().split())].add(rec["id"])
+        for field, kind in (("conditions", "condition"), ("allergens", "allergen")):
+            for term in rec.get(field) or []:
+                by_term[(kind, term)].add(rec["id"])
+
+    queries = []
+    titles = [rec for rec in records if rec.get("title")]
+    if max_title_queries:
+        titles = random.Random(seed).sample(titles, min(max_title_queries, len(titles)))
+    for rec in titles:
+        queries.append({"query": rec["title"], "type": "title",
+                        "relevant": sorted(by_title[" ".join(rec["title"].lower().split())])})
+    for (kind, term), ids in sorted(by_term.items()):
+        if 1 <= len(ids) <= MAX_TERM_DOCS:
+            queries.append({"query": f"{term} in India", "type": kind, "relevant": sorted(ids)})
+    for i, q in enumerate(queries):
+        q["qid"] = f"q{i}"
+    return queries
+
+
+def _doc_key(text):
+    return " ".join((text or "").split())[:300]
+
+
+def _live_id_map(records):
+    """Map document text in the serving index back to record ids (older indexes also hold the bare text form)."""
+    mapping = {}
+    for rec in records:
+        mapping[_doc_key(rec.get("text"))] = rec["id"]
+        mapping[_doc_key(f"{rec.get('title', '')} {rec.get('summary', '')} {rec.get('text', '')}")] = rec["id"]
+    return mapping
+
+
+class EvalIndex:
+    """A throwaway index over the corpus, built with the settings under test."""
+
+    def __init__(self, records, backend, model, text_field):
+        from sentence_transformers import SentenceTransformer
+        from vector_store import NumpyVectorStore
+
+        self.embedder = SentenceTransformer(model)
+        texts = [_record_text(rec, text_field) for rec in records]
+        embeddings = self.embedder.encode(texts, batch_size=32)
+        ids = [rec["id"] for rec in records]
+        if backend == "numpy":
+            self.store = NumpyVectorStore(path=None)
+        else:
+            import chromadb
+            from index_config import hnsw_metadata
+            from vector_store import ChromaVectorStore
+
+            client = chromadb.EphemeralClient()
+            try:
+                client.delete_collection("eval")
+            except Exception:
+                pass
+            self.store = ChromaVectorStore("eval", create=True, metadata=hnsw_metadata("allergy"), client=client)
+        self.store.add(ids=ids, embeddings=embeddings, documents=texts)
+
+    def search(self, query, k):
+        t0 = time.perf_counter()
+        emb = self.embedder.encode(query)
+        t1 = time.perf_counter()
+        hits = self.store.query(emb, k=k)
+        t2 = time.perf_counter()
+        return [h["id"] for h in hits], (t1 - t0) * 1000, (t2 - t1) * 1000
+
+
+class LiveIndex:
+    """The serving retrieval path (gemini_api.retrieve: store, backend and reranker from .env)."""
+
+    def __init__(self, records):
+        import gemini_api
+
+        self.gemini_api = gemini_api
+        self.id_map = _live_id_map(records)
+        gemini_api.preload()
+
+    def search(self, query, k):
+        t0 = time.perf_counter()
+        hits = self.gemini_api.retrieve(query, n_results=k)
+        total = (time.perf_counter() - t0) * 1000
+        ids = []
+        for h in hits:
+            rid = self.id_map.get(_doc_key(h["document"]), f"unknown:{h['id']}")
+            if rid not in ids:  # indexes built before deduplication hold a paper twice
+                ids.append(rid)
+        return ids, 0.0, total
+
+
+def _record_text(rec, field):
+    if field == "title+summary+text":
+        # exactly what build_index.load_documents indexes for the serving collection
+        return f"{rec.get('title') or ''} {rec.get('summary') or ''} {rec.get('text') or ''}"
+    if field == "title+summary":
+        return f"{rec.get('title', '')}. {rec.get('summary', '')}"
+    return rec.get(field) or rec.get("summary") or ""
+
+
+def score(ranked, relevant, k):
+    relevant = set(relevant)
+    top = ranked[:k]
+    hits = [1 if doc in relevant else 0 for doc in top]
+    recall = sum(hits) / len(relevant)
+    rr = next((1.0 / (i + 1) for i, h in enumerate(hits) if h), 0.0)
+    dcg = sum(h / math.log2(i + 2) for i, h in enumerate(hits))
+    ideal = sum(1 / math.log2(i + 2) for i in range(min(len(relevant), k)))
+    return {"recall": recall, "mrr": rr, "ndcg": dcg / ideal if ideal else 0.0}
+
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def evaluate(name, queries, records, k=5, index="eval", backend="numpy", model="all-MiniLM-L6-v2",
+             text_field="title+summary+text"):
+    t0 = time.perf_counter()
+    tracemalloc.start()
+    idx = LiveIndex(records) if index == "live" else EvalIndex(records, backend, model, text_field)
+    build_s = time.perf_counter() - t0
+    # one traced query adds its working memory to the peak; tracing every allocation slows
+    # queries several-fold, so it is stopped before the timed pass
+    if queries:
+        idx.search(queries[0]["query"], k)
+    peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+
+    per_query = []
+    for q in queries:
+        ranked, embed_ms, search_ms = idx.search(q["query"], k)
+        per_query.append({"qid": q["qid"], "type": q["type"], **score(ranked, q["relevant"], k),
+                          "embed_ms": embed_ms, "search_ms": search_ms})
+
+    def summarize(rows):
+        return {
+            "n": len(rows),
+            f"recall@{k}": round(statistics.mean(r["recall"] for r in rows), 4),
+            "mrr": round(statistics.mean(r["mrr"] for r in rows), 4),
+            f"ndcg@{k}": round(statistics.mean(r["ndcg"] for r in rows), 4),
+            "p50_ms": round(_pct([r["embed_ms"] + r["search_ms"] for r in rows], 50), 3),
+            "p95_ms": round(_pct([r["embed_ms"] + r["search_ms"] for r in rows], 95), 3),
+            "search_p50_ms": round(_pct([r["search_ms"] for r in rows], 50), 3),
+        }
+
+    by_type = defaultdict(list)
+    for r in per_query:
+        by_type[r["type"]].append(r)
+    run = {
+        "name": name, "created": int(time.time()), "k": k,
+        "config": {"index": index, "backend": backend if index == "eval" else os.environ.get("VECTOR_BACKEND", "chroma"),
+                   "model": model, "text_field": text_field},
+        "overall": summarize(per_query),
+        "by_type": {t: summarize(rows) for t, rows in sorted(by_type.items())},
+        "memory": {"python_peak_mb": round(peak_mb, 1),
+                   "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+                   if resource else None},
+        "build_s": round(build_s, 2),
+        "per_query": per_query,
+    }
+    RUNS_DIR.mkdir(parents=True, exist_ok=True)
+    with open(RUNS_DIR / f"{name}.json", "w", encoding="utf-8") as f:
+        json.dump(run, f, indent=2)
+    return run
+
+
+def compare(names):
+    """Print runs side by side (overall and per query type)."""
+    runs = [json.loads((RUNS_DIR / f"{n}.json").read_text(encoding="utf-8")) for n in names]
+    sections = [("overall", [r["overall"] for r in runs])]
+    for t in sorted({t for r in runs for t in r["by_type"]}):
+        sections.append((t, [r["by_type"].get(t, {}) for r in runs]))
+    width = max(12, *(len(n) for n in names))
+    print(" " * 22 + "".join(f"{n:>{width + 2}}" for n in names))
+    for title, blocks in sections:
+        print(f"[{title}]")
+        for metric in [m for m in blocks[0] if m != "n"]:
+            values = "".join(f"{str(b.get(metric, '-')):>{width + 2}}" for b in blocks)
+            print(f"  {metric:20s}{values}")
+    print("[memory]")
+    for metric in runs[0]["memory"]:
+        print(f"  {metric:20s}" + "".join(f"{str(r['memory'][metric]):>{width + 2}}" for r in runs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline retrieval quality and latency evaluation")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_gen = sub.add_parser("generate", help="write a weakly labelled query set")
+    p_gen.add_argument("--out", default="eval/queries.jsonl")
+    p_gen.add_argument("--max-title-queries", type=int)
+    p_run = sub.add_parser("run", help="evaluate one retrieval configuration")
+    p_run.add_argument("name", help="run name (saved to eval/runs/<name>.json)")
+    p_run.add_argument("--queries", default="eval/queries.jsonl", help="generated on the fly if missing")
+    p_run.add_argument("--k", type=int, default=5)
+    p_run.add_argument("--index", choices=["eval", "live"], default="eval",
+                       help="eval: build a fresh index with the options below; live: the serving retrieval path")
+    p_run.add_argument("--backend", choices=["numpy", "chroma"], default="numpy")
+    p_run.add_argument("--model", default="all-MiniLM-L6-v2")
+    p_run.add_argument("--text-field", choices=["title+summary+text", "summary", "text", "title+summary"],
+                       default="title+summary+text", help="document text of the eval index (default: as build_index.py)")
+    p_cmp = sub.add_parser("compare", help="show saved runs side by side")
+    p_cmp.add_argument("names", nargs="+")
+    args = parser.parse_args()
+
+    if args.cmd == "compare":
+        compare(args.names)
+    else:
+        records = load_records()
+        if args.cmd == "generate" or not os.path.exists(args.queries):
+            queries = generate_queries(records, max_title_queries=getattr(args, "max_title_queries", None))
+            out = args.out if args.cmd == "generate" else args.queries
+            Path(out).parent.mkdir(parents=True, exist_ok=True)
+            with open(out, "w", encoding="utf-8") as f:
+                for q in queries:
+                    f.write(json.dumps(q, ensure_ascii=False) + "\n")
+            print(f"Wrote {len(queries)} queries to {out}")
+        if args.cmd == "run":
+            with open(args.queries, "r", encoding="utf-8") as f:
+                queries = [json.loads(line) for line in f if line.strip()]
+            run = evaluate(args.name, queries, records, k=args.k, index=args.index, backend=args.backend,
+                           model=args.model, text_field=args.text_field)
+            print(json.dumps({k: v for k, v in run.items() if k != "per_query"}, indent=2))
@@ -1,30 +1,109 @@
 # RAG-enabled Gemini API call
 import os
-import chromadb
+import threading
+from functools import lru_cache
 from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
+from index_config import serving_db_path, active_collection
+from vector_store import get_vector_store
+import reranker
+from llm_governor import (governor, answer_cache, estimate_tokens, GeminiError, Rejected,
+                          PRIORITY_INTERACTIVE)
 load_dotenv()
 
-def call_gemini_api(prompt, api_key):
-    # Load ChromaDB and embedder
-    client = chromadb.PersistentClient(path="./chroma_db")
-    collection = client.get_collection("allergy")
-    embedder = SentenceTransformer("all-MiniLM-L6-v2")
+EMBED_MODEL = "all-MiniLM-L6-v2"
+COLLECTION_NAME = os.environ.get("RAG_COLLECTION", "allergy")
+TOP_K = 5
+GEMINI_API_URL = os.environ.get(
+    "GEMINI_API_URL", "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent")
+GEMINI_TIMEOUT_S = float(os.environ.get("GEMINI_TIMEOUT_S", "30"))
+# how long an interactive request may wait for quota before getting a degraded answer
+GEMINI_DEADLINE_S = float(os.environ.get("GEMINI_DEADLINE_S", "15"))
 
-    # Step 1: Embed query
-    query_emb = embedder.encode(prompt).tolist()
 
-    # Step 2: Search in ChromaDB
-    results = collection.query(query_embeddings=[query_emb], n_results=5)
-    docs = [doc for doc in results["documents"][0]]
-    context = "\n\n".join(docs)
+@lru_cache(maxsize=None)
+def get_embedder():
+    return SentenceTransformer(EMBED_MODEL)
 
-    # Step 3: Send to Gemini with context
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent"
-    headers = {
-        "Content-Type": "application/json",
-        "x-goog-api-key": api_key
-    }
+
+# the store currently serving requests: {"name", "version", "store"}
+_serving = {}
+_swap_lock = threading.Lock()
+
+
+def _open_and_swap(name, version):
+    try:
+        store = get_vector_store(name, persist_dir=serving_db_path())
+        # touch the index once so the first real request does not pay for loading it
+        store.query(get_embedder().encode("warm up"), k=1)
+    except Exception as e:
+        print(f"Could not load index {name}, still serving {_serving.get('name')}:", e)
+        with _swap_lock:
+            _serving["loading"] = None
+        return
+    with _swap_lock:
+        _serving.update(name=name, version=version, store=store, loading=None)
+
+
+def get_store():
+    """
+    Vector store for COLLECTION_NAME, loaded once per process (backend chosen by
+    VECTOR_BACKEND). When a background rebuild activates a new version, it is
+    opened on a side thread and swapped in; requests keep using the old store
+    until then, so they never see a half-loaded index. A worker that stayed idle
+    until its collection was dropped by a later rebuild switches synchronously.
+    """
+    name, version = active_collection(COLLECTION_NAME)
+    if not _serving.get("store") or (_serving["name"] != name and not _serving["store"].exists()):
+        with _swap_lock:
+            if not _serving.get("store") or _serving["name"] != name:
+                _serving.update(name=name, version=version, loading=None,
+                                store=get_vector_store(name, persist_dir=serving_db_path()))
+    elif _serving["name"] != name:
+        with _swap_lock:
+            start = _serving.get("loading") != name
+            if start:
+                _serving["loading"] = name
+        if start:
+            threading.Thread(target=_open_and_swap, args=(name, version), daemon=True).start()
+    return _serving["store"]
+
+
+def index_version():
+    """Version of the index currently serving requests."""
+    get_store()
+    return _serving["version"]
+
+
+def retrieve(prompt, n_results=TOP_K):
+    """
+    Return the top passages for `prompt` as vector store hits. With RERANK_ENABLED=1
+    a larger candidate set is reranked by a cross-encoder and RERANK_TOP_K are kept.
+    """
+    query_emb = get_embedder().encode(prompt)
+    if reranker.RERANK_ENABLED:
+        candidates = get_store().query(query_emb, k=max(reranker.RERANK_CANDIDATES, n_results))
+        return reranker.rerank(prompt, candidates, top_k=min(n_results, reranker.RERANK_TOP_K))
+    return get_store().query(query_emb, k=n_results)
+
+
+def preload(include_store=True):
+    """
+    Load the embedder, vector index, medicine index and (if enabled) reranker. serve.py calls this in
+    the master process before forking so workers share the weights copy-on-write.
+    """
+    from medicine_db import get_medicine_index
+
+    get_embedder()
+    get_medicine_index()
+    if include_store:
+        get_store()
+    if reranker.RERANK_ENABLED:
+        reranker.get_cross_encoder()
+
+
+def build_prompt(prompt, hits, history=None):
+    context = "\n\n".join(hit["document"] for hit in hits)
     instructions = (
         "You are a helpful medical expert assistant. Out of medical Expertise you don't provide any informations, only to medical asks. Provide accurate and concise information with supporting/reference links. ",
         "using attached database of medicines of india and indian government sources , provide accurate of indian's health there food and exercise habits, suggest them there personal assistant (remeber you are not a Doctor), provide results of physicologist, physiotherapist, psychiatrist, general physician, cardiologist, dermatologist, neurologist, gynecologist, urologist, ENT specialist, pediatrician, oncologist, endocrinologist, nephrologist, gastroenterologist, pulmonologist, rheumatologist and other medical fields. ",
@@ -32,7 +111,18 @@ def call_gemini_api(prompt, api_key):
         "Do not use following phrases while Providing response: '**', '--', instead use arrows, emojies like '➡️', '💊', '🔗' etc. to make it more engaging and visually appealing.\n"
     )
     instructions_text = ' '.join(instructions)
-    full_prompt = f"{instructions_text}\nContext from research papers and clinical data:\n{context}\n\nUser question: {prompt}\nAnswer in clear, helpful language:"
+    conversation = f"Conversation so far:\n{history}\n\n" if history else ""
+    return f"{instructions_text}\nContext from research papers and clinical data:\n{context}\n\n{conversation}User question: {prompt}\nAnswer in clear, helpful language:"
+
+
+def generate(full_prompt, api_key):
+    """Send the prompt to Gemini. Returns (text, total_tokens); raises GeminiError on failure."""
+    import requests
+
+    headers = {
+        "Content-Type": "application/json",
+        "x-goog-api-key": api_key
+    }
     payload = {
         "contents": [
             {
@@ -41,13 +131,74 @@ def call_gemini_api(prompt, api_key):
             }
         ]
     }
-    import requests
-    response = requests.post(url, headers=headers, json=payload)
-    if response.status_code == 200:
-        data = response.json()
-        try:
-            return data["candidates"][0]["content"]["parts"][0]["text"]
-        except Exception:
-            return "No valid response from Gemini API."
-    else:
-        return f"Gemini API error: {response.status_code} {response.text}"
+    try:
+        response = requests.post(GEMINI_API_URL, headers=headers, json=payload, timeout=GEMINI_TIMEOUT_S)
+    except requests.RequestException as e:
+        raise GeminiError(0, f"request failed: {e}")
+    if response.status_code != 200:
+        retry_after = response.headers.get("Retry-After")
+        raise GeminiError(response.status_code, response.text[:500],
+                          retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+    data = response.json()
+    try:
+        text = data["candidates"][0]["content"]["parts"][0]["text"]
+    except Exception:
+        raise GeminiError(200, "No valid response from Gemini API.")
+    return text, data.get("usageMetadata", {}).get("totalTokenCount")
+
+
+def _citation(hit):
+    meta = hit.get("metadata") or {}
+    if meta.get("title"):
+        year = f" ({meta['year']})" if meta.get("year") else ""
+        return f"{meta['title']}{year}"
+    return f"source document {hit['id']}"
+
+
+def _degraded(prompt, hits, reason, history=None):
+    """Answer without the LLM: a cached answer if we have one, else the top passages with citations."""
+    cached = None if history else answer_cache.get(prompt)
+    if cached:
+        return {"answer": cached, "degraded": True, "reason": reason, "cached": True}
+    lines = ["⚠️ The assistant is very busy right now, so here are the most relevant passages from our sources:"]
+    for hit in hits[:3]:
+        snippet = " ".join((hit["document"] or "").split())[:300]
+        lines.append(f"➡️ {snippet}…\n🔗 {_citation(hit)}")
+    if len(lines) == 1:
+        lines.append("➡️ Please try again in a minute.")
+    return {"answer": "\n\n".join(lines), "degraded": True, "reason": reason, "cached": False}
+
+
+def ask_gemini(prompt, api_key, history=None, retrieval_query=None, hits=None,
+               priority=PRIORITY_INTERACTIVE, deadline_s=GEMINI_DEADLINE_S):
+    """
+    RAG answer for `prompt`, sent through the quota governor.
+    `history`: earlier conversation (see sessions.history_text) included in the prompt.
+    `retrieval_query`: text to search with instead of `prompt`, e.g. a rewritten follow-up.
+    `hits`: already retrieved passages (skips retrieval).
+    Returns {"answer", "degraded", "reason", ...}; when the budget is exhausted or Gemini
+    fails, the answer is a cached or retrieval-only one instead of an error.
+    """
+    # Step 1 + 2: Embed query and search the vector store
+    if hits is None:
+        hits = retrieve(retrieval_query or prompt)
+
+    # Step 3: Send to Gemini with context
+    full_prompt = build_prompt(prompt, hits, history)
+    try:
+        with governor.acquire(estimate_tokens(full_prompt), priority=priority, deadline_s=deadline_s) as permit:
+            text, permit.used = generate(full_prompt, api_key)
+    except Rejected as e:
+        return _degraded(prompt, hits, e.reason, history)
+    except GeminiError as e:
+        if e.status == 429:
+            governor.throttle(e.retry_after)
+        print(e)
+        return _degraded(prompt, hits, f"gemini_{e.status}", history)
+    if not history:
+        answer_cache.put(prompt, text)
+    return {"answer": text, "degraded": False, "reason": None}
+
+
+def call_gemini_api(prompt, api_key, history=None, retrieval_query=None):
+    return ask_gemini(prompt, api_key, history=history, retrieval_query=retrieval_query)["answer"]
@@ -0,0 +1,79 @@
+# gemini_stub.py
+# Local stand-in for the Gemini generateContent endpoint, for benchmarks and offline runs.
+# Point the app at it with GEMINI_API_URL=http://127.0.0.1:8765/generate
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class GeminiStubHandler(BaseHTTPRequestHandler):
+    latency_ms = 200.0
+    # like the real API, answer 429 once more than `rpm_limit` requests arrive within a minute (0 = no limit)
+    rpm_limit = 0
+    _window = []
+    _lock = threading.Lock()
+
+    def _rate_limited(self):
+        if not self.rpm_limit:
+            return False
+        now = time.time()
+        with self._lock:
+            self._window[:] = [t for t in self._window if now - t < 60]
+            if len(self._window) >= self.rpm_limit:
+                return True
+            self._window.append(now)
+        return False
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if self._rate_limited():
+            self.send_response(429)
+            self.send_header("Retry-After", "5")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        try:
+            prompt = payload["contents"][0]["parts"][0]["text"]
+        except (KeyError, IndexError):
+            prompt = ""
+        # simulate generation time
+        time.sleep(self.latency_ms / 1000.0)
+        question = prompt.rsplit("User question:", 1)[-1].split("\n")[0].strip()
+        body = {
+            "candidates": [{"content": {"parts": [{"text": f"➡️ Stub answer for: {question}"}]}}],
+            "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": 20},
+        }
+        self._send(200, body)
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host="127.0.0.1", port=8765, latency_ms=200.0, rpm_limit=0):
+    handler = type("ConfiguredStubHandler", (GeminiStubHandler,),
+                   {"latency_ms": latency_ms, "rpm_limit": rpm_limit, "_window": []})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Gemini API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="simulated generation latency")
+    parser.add_argument("--rpm-limit", type=int, default=0, help="answer 429 above this many requests per minute")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency_ms, args.rpm_limit)
+    print(f"Gemini stub listening on http://{args.host}:{args.port}/generate")
+    server.serve_forever()
@@ -0,0 +1,248 @@
+# index_config.py
+# HNSW / distance settings for the Chroma collections, plus read-only index snapshots.
+import os
+import json
+import time
+import shutil
+import hashlib
+import tarfile
+from functools import lru_cache
+from pathlib import Path
+from dotenv import load_dotenv
+load_dotenv()
+
+CHROMA_DB_PATH = os.environ.get("CHROMA_DB_PATH", "./chroma_db")
+SNAPSHOT_MANIFEST = "snapshot_manifest.json"
+ACTIVE_COLLECTIONS_FILE = "active_collections.json"
+# a process holding the snapshot unpack lock longer than this is assumed dead
+SNAPSHOT_LOCK_TIMEOUT_S = 600
+
+# MiniLM embeddings are trained for cosine similarity, so both collections default to it.
+DEFAULT_HNSW = {"space": "cosine", "M": 16, "construction_ef": 200, "search_ef": 64}
+
+COLLECTION_CONFIGS = {
+    "allergy": dict(DEFAULT_HNSW),
+    "indian_skin_allergy": dict(DEFAULT_HNSW),
+}
+
+
+def hnsw_config(collection_name):
+    """
+    Return the HNSW settings for a collection. Any value can be overridden from the
+    environment, e.g. ALLERGY_HNSW_M=32 or INDIAN_SKIN_ALLERGY_HNSW_SEARCH_EF=128.
+    """
+    config = dict(COLLECTION_CONFIGS.get(collection_name, DEFAULT_HNSW))
+    prefix = collection_name.upper() + "_HNSW_"
+    for key, default in list(config.items()):
+        value = os.environ.get(prefix + key.upper())
+        if value is not None:
+            config[key] = value if isinstance(default, str) else int(value)
+    return config
+
+
+def hnsw_metadata(collection_name, **overrides):
+    """Chroma collection metadata ("hnsw:*" keys) for `get_or_create_collection`."""
+    config = hnsw_config(collection_name)
+    config.update(overrides)
+    return {f"hnsw:{k}": v for k, v in config.items()}
+
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def export_snapshot(out_path, persist_dir=CHROMA_DB_PATH):
+    """
+    Pack `persist_dir` into a .tar.gz snapshot with a manifest of collection
+    settings and file checksums. Serving nodes load it with `load_snapshot`.
+    """
+    import chromadb
+
+    persist_dir = Path(persist_dir)
+    client = chromadb.PersistentClient(path=str(persist_dir))
+    collections = {}
+    for col in client.list_collections():
+        # list_collections returns names on newer chroma versions and objects on older ones
+        name = col if isinstance(col, str) else col.name
+        c = client.get_collection(name)
+        collections[name] = {"count": c.count(), "metadata": c.metadata or {}}
+
+    files = {}
+    for p in sorted(persist_dir.rglob("*")):
+        # background job status files are local to the node that ran them
+        if p.is_file() and p.relative_to(persist_dir).parts[0] != "jobs":
+            files[p.relative_to(persist_dir).as_posix()] = _file_sha256(p)
+
+    manifest = {"created": int(time.time()), "collections": collections, "files": files}
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    # linked files are stored as regular files: load_snapshot refuses link members
+    with tarfile.open(out_path, "w:gz", dereference=True) as tar:
+        for rel in files:
+            tar.add(persist_dir / rel, arcname=rel)
+        manifest_tmp = out_path.with_suffix(".manifest.tmp")
+        manifest_tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        tar.add(manifest_tmp, arcname=SNAPSHOT_MANIFEST)
+        manifest_tmp.unlink()
+    print(f"Exported snapshot of {len(collections)} collections ({len(files)} files) to {out_path}")
+    return manifest
+
+
+def _unpacked_manifest(archive, target_dir):
+    """Manifest of `target_dir` if it already holds this snapshot, else None."""
+    try:
+        current = json.loads((target_dir / SNAPSHOT_MANIFEST).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None  # not unpacked yet, or being replaced by the process holding the lock
+    with tarfile.open(archive, "r:gz") as tar:
+        packed = json.load(tar.extractfile(SNAPSHOT_MANIFEST))
+    return current if packed == current else None
+
+
+def load_snapshot(archive, target_dir, lock_timeout_s=SNAPSHOT_LOCK_TIMEOUT_S):
+    """
+    Unpack a snapshot into `target_dir` and verify its checksums.
+    The target is treated as read-only: the serving app only opens existing
+    collections from it and never writes, so nothing needs rebuilding at startup.
+    Safe to call from several processes at once: one unpacks under `<target>.lock`
+    while the others wait for it. Returns the snapshot manifest.
+    """
+    target_dir = Path(target_dir)
+    lock = target_dir.with_name(target_dir.name + ".lock")
+    while True:
+        manifest = _unpacked_manifest(archive, target_dir)
+        if manifest is not None:
+            return manifest
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - lock.stat().st_mtime > lock_timeout_s:
+                    lock.unlink()  # left behind by a process that died while unpacking
+            except FileNotFoundError:
+                pass
+            time.sleep(0.2)
+            continue
+        os.close(fd)
+        try:
+            # another process may have finished between our check and taking the lock
+            manifest = _unpacked_manifest(archive, target_dir)
+            if manifest is None:
+                # a different (or partial) snapshot is only ever removed while holding the lock
+                if target_dir.exists():
+                    shutil.rmtree(target_dir)
+                manifest = _unpack(archive, target_dir)
+            return manifest
+        finally:
+            lock.unlink(missing_ok=True)
+
+
+def _unpack(archive, target_dir):
+    tmp_dir = target_dir.with_name(f"{target_dir.name}.loading.{os.getpid()}")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+    try:
+        with tarfile.open(archive, "r:gz") as tar:
+            for member in tar.getmembers():
+                # refuse absolute paths / parent traversal, and links or devices that could point outside
+                if member.name.startswith("/") or ".." in Path(member.name).parts:
+                    raise ValueError(f"Unsafe path in snapshot: {member.name}")
+                if not (member.isfile() or member.isdir()):
+                    raise ValueError(f"Unsupported member type in snapshot: {member.name}")
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(tmp_dir, filter="data")
+            else:
+                tar.extractall(tmp_dir)
+
+        manifest = json.loads((tmp_dir / SNAPSHOT_MANIFEST).read_text(encoding="utf-8"))
+        for rel, digest in manifest["files"].items():
+            if _file_sha256(tmp_dir / rel) != digest:
+                raise ValueError(f"Snapshot checksum mismatch for {rel}")
+        tmp_dir.rename(target_dir)
+    finally:
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+    print(f"Loaded snapshot with collections {list(manifest['collections'])} into {target_dir}")
+    return manifest
+
+
+@lru_cache(maxsize=None)
+def serving_db_path():
+    """
+    Directory the app should read collections from. If CHROMA_SNAPSHOT points at an
+    exported snapshot it is unpacked into CHROMA_SNAPSHOT_DIR and served from there.
+    """
+    snapshot = os.environ.get("CHROMA_SNAPSHOT")
+    if not snapshot:
+        return CHROMA_DB_PATH
+    target = os.environ.get("CHROMA_SNAPSHOT_DIR", "./chroma_snapshot")
+    load_snapshot(snapshot, target)
+    return target
+
+
+_active_cache = {}
+
+
+def _read_active(persist_dir):
+    """Parsed active_collections.json, re-read only when its mtime changes."""
+    path = Path(persist_dir) / ACTIVE_COLLECTIONS_FILE
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    cached = _active_cache.get(str(path))
+    if cached and cached[0] == mtime:
+        return cached[1]
+    data = json.loads(path.read_text(encoding="utf-8"))
+    _active_cache[str(path)] = (mtime, data)
+    return data
+
+
+def active_collection(base_name, persist_dir=None):
+    """
+    Name and version of the collection currently serving `base_name`. Rebuilt
+    collections are named "<base>__v<version>"; before the first rebuild the base
+    collection itself is served with version "base".
+    """
+    entry = _read_active(persist_dir or serving_db_path()).get(base_name)
+    if not entry:
+        return base_name, "base"
+    return entry["collection"], entry["version"]
+
+
+def activate_collection(base_name, collection_name, version, persist_dir=CHROMA_DB_PATH):
+    """Point `base_name` at `collection_name`. The pointer file is replaced atomically."""
+    path = Path(persist_dir) / ACTIVE_COLLECTIONS_FILE
+    data = dict(_read_active(persist_dir))
+    data[base_name] = {"collection": collection_name, "version": version, "activated": int(time.time())}
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect index settings and manage index snapshots")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("show", help="print the HNSW settings for each collection")
+    p_exp = sub.add_parser("export", help="export a snapshot of the Chroma directory")
+    p_exp.add_argument("out", help="output .tar.gz path")
+    p_exp.add_argument("--persist-dir", default=CHROMA_DB_PATH)
+    p_load = sub.add_parser("load", help="unpack a snapshot for serving")
+    p_load.add_argument("archive")
+    p_load.add_argument("target_dir")
+    args = parser.parse_args()
+
+    if args.cmd == "show":
+        for name in COLLECTION_CONFIGS:
+            print(name, hnsw_metadata(name))
+    elif args.cmd == "export":
+        export_snapshot(args.out, persist_dir=args.persist_dir)
+    else:
+        load_snapshot(args.archive, args.target_dir)
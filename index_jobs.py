@@ -0,0 +1,196 @@
+# index_jobs.py
+# Background index rebuilds: build a versioned collection in a separate process,
+# validate it, then atomically switch serving over to it.
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+import multiprocessing
+from pathlib import Path
+from index_config import CHROMA_DB_PATH, active_collection, activate_collection
+from vector_store import VECTOR_BACKEND, numpy_store_path
+
+JOBS_DIR = Path(CHROMA_DB_PATH) / "jobs"
+LOCK_FILE = JOBS_DIR / "build.lock"
+KEEP_VERSIONS = int(os.environ.get("INDEX_KEEP_VERSIONS", "2"))
+
+
+def _status_path(job_id):
+    return JOBS_DIR / f"{job_id}.json"
+
+
+def _write_status(job_id, **fields):
+    path = _status_path(job_id)
+    status = read_status(job_id) or {"id": job_id}
+    status.update(fields, updated=int(time.time()))
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(status, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+    return status
+
+
+def read_status(job_id):
+    try:
+        return json.loads(_status_path(job_id).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _acquire_lock(job_id):
+    """Only one build runs at a time across all app workers."""
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    for _ in range(2):
+        try:
+            fd = os.open(LOCK_FILE, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                holder = json.loads(LOCK_FILE.read_text(encoding="utf-8"))
+            except (FileNotFoundError, ValueError):
+                continue
+            if _pid_alive(holder.get("pid", -1)):
+                return holder["job_id"]
+            LOCK_FILE.unlink(missing_ok=True)  # stale lock from a crashed build
+            continue
+        with os.fdopen(fd, "w") as f:
+            json.dump({"job_id": job_id, "pid": os.getpid()}, f)
+        return None
+    raise RuntimeError("Could not acquire the index build lock")
+
+
+def _release_lock(job_id):
+    try:
+        holder = json.loads(LOCK_FILE.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return
+    if holder.get("job_id") == job_id:
+        LOCK_FILE.unlink(missing_ok=True)
+
+
+def _validate(store, ids, texts, embedder_name="all-MiniLM-L6-v2"):
+    """The new collection must hold every document and find known documents by their own text."""
+    from sentence_transformers import SentenceTransformer
+
+    if store.count() != len(texts):
+        raise ValueError(f"expected {len(texts)} documents, collection has {store.count()}")
+    embedder = SentenceTransformer(embedder_name)
+    probes = list(range(0, len(texts), max(1, len(texts) // 10)))[:10]
+    results = store.query_batch(embedder.encode([texts[i] for i in probes]), k=5)
+    found = sum(1 for i, hits in zip(probes, results) if ids[i] in {h["id"] for h in hits})
+    if found < len(probes):
+        raise ValueError(f"only {found}/{len(probes)} probe documents retrieved from the new collection")
+
+
+def _drop_collection(name, backend):
+    if backend == "numpy":
+        shutil.rmtree(numpy_store_path(CHROMA_DB_PATH, name), ignore_errors=True)
+        return
+    import chromadb
+
+    try:
+        chromadb.PersistentClient(path=CHROMA_DB_PATH).delete_collection(name)
+    except Exception:
+        pass
+
+
+def _versions_file(base_name):
+    return JOBS_DIR / f"{base_name}_versions.json"
+
+
+def _cleanup_old_versions(base_name, new_name, backend):
+    """Keep the newest KEEP_VERSIONS built collections (the previous one allows a quick rollback)."""
+    path = _versions_file(base_name)
+    versions = json.loads(path.read_text(encoding="utf-8")) if path.exists() else []
+    versions.append(new_name)
+    for old in versions[:-KEEP_VERSIONS]:
+        _drop_collection(old, backend)
+    path.write_text(json.dumps(versions[-KEEP_VERSIONS:]), encoding="utf-8")
+
+
+def _run_build(job_id, base_name, backend):
+    """Entry point of the build process."""
+    import build_index
+
+    version = time.strftime("%Y%m%dT%H%M%S")
+    new_name = f"{base_name}__v{version}"
+    try:
+        _write_status(job_id, state="running", stage="embedding", collection=new_name, pid=os.getpid())
+
+        def progress(done, total):
+            _write_status(job_id, done=done, total=total)
+
+        store, ids, texts = build_index.build(new_name, persist_dir=CHROMA_DB_PATH, backend=backend,
+                                              progress=progress)
+        _write_status(job_id, stage="validating")
+        _validate(store, ids, texts)
+
+        activate_collection(base_name, new_name, version, persist_dir=CHROMA_DB_PATH)
+        _cleanup_old_versions(base_name, new_name, backend)
+        _write_status(job_id, state="succeeded", stage="active", version=version, finished=int(time.time()))
+    except Exception as e:
+        # the half-built collection was never activated; remove it
+        _drop_collection(new_name, backend)
+        _write_status(job_id, state="failed", error=f"{type(e).__name__}: {e}", finished=int(time.time()))
+    finally:
+        _release_lock(job_id)
+
+
+def start_rebuild(base_name="allergy", backend=None):
+    """
+    Start a background rebuild of `base_name` and return its status. If a build is
+    already running, that job's status is returned instead of starting a second one.
+    """
+    backend = backend or VECTOR_BACKEND
+    job_id = uuid.uuid4().hex[:12]
+    running = _acquire_lock(job_id)
+    if running:
+        return read_status(running) or {"id": running, "state": "running"}
+    status = _write_status(job_id, state="queued", base=base_name, backend=backend,
+                           previous=active_collection(base_name, CHROMA_DB_PATH)[0], started=int(time.time()))
+
+    # a spawned process keeps the embedding work off the serving process entirely
+    proc = multiprocessing.get_context("spawn").Process(target=_run_build, args=(job_id, base_name, backend),
+                                                        daemon=False)
+    proc.start()
+    # the child now owns the lock
+    LOCK_FILE.write_text(json.dumps({"job_id": job_id, "pid": proc.pid}), encoding="utf-8")
+
+    def _reap():
+        proc.join()
+        current = read_status(job_id) or {}
+        if current.get("state") not in ("succeeded", "failed"):
+            _write_status(job_id, state="failed", error=f"build process exited with code {proc.exitcode}")
+            _release_lock(job_id)
+
+    threading.Thread(target=_reap, daemon=True).start()
+    return status
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rebuild an index in the background and hot swap it in")
+    parser.add_argument("--collection", default="allergy")
+    parser.add_argument("--backend", choices=["chroma", "numpy"])
+    args = parser.parse_args()
+
+    job = start_rebuild(args.collection, backend=args.backend)
+    print("Started job", job["id"])
+    while True:
+        time.sleep(2)
+        job = read_status(job["id"])
+        print(job.get("state"), job.get("stage"), f"{job.get('done', 0)}/{job.get('total', '?')}")
+        if job.get("state") in ("succeeded", "failed"):
+            print(json.dumps(job, indent=2))
+            break
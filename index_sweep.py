@@ -0,0 +1,104 @@
+# index_sweep.py
+# Recall/latency sweep of HNSW settings against brute-force NumPy search on our corpus.
+import json
+import time
+import argparse
+import itertools
+import numpy as np
+import chromadb
+from sentence_transformers import SentenceTransformer
+from index_config import hnsw_metadata
+
+EMBED_MODEL = "all-MiniLM-L6-v2"
+
+
+def load_corpus(path):
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    texts = [r.get("text") or r.get("summary") or "" for r in records]
+    # titles make realistic short queries whose answers live somewhere in the corpus
+    queries = [r.get("title") for r in records if r.get("title")]
+    return texts, queries
+
+
+def brute_force_topk(doc_embs, query_embs, k, space):
+    """Exact top-k ids (as strings) for each query, using the same distance as the index."""
+    if space == "l2":
+        d2 = (query_embs ** 2).sum(1)[:, None] - 2 * query_embs @ doc_embs.T + (doc_embs ** 2).sum(1)[None, :]
+        scores = -d2
+    else:
+        # cosine and inner product coincide on normalized vectors
+        scores = query_embs @ doc_embs.T
+    k = min(k, doc_embs.shape[0])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(str(i) for i in row) for row in top]
+
+
+def run_sweep(texts, queries, k, spaces, ms, construction_efs, search_efs):
+    embedder = SentenceTransformer(EMBED_MODEL)
+    doc_embs = embedder.encode(texts, batch_size=32, normalize_embeddings=True).astype(np.float32)
+    query_embs = embedder.encode(queries, batch_size=32, normalize_embeddings=True).astype(np.float32)
+    ids = [str(i) for i in range(len(texts))]
+
+    client = chromadb.EphemeralClient()
+    rows = []
+    for space, m, cef, sef in itertools.product(spaces, ms, construction_efs, search_efs):
+        name = f"sweep_{space}_{m}_{cef}_{sef}"
+        meta = hnsw_metadata("allergy", space=space, M=m, construction_ef=cef, search_ef=sef)
+        try:
+            client.delete_collection(name)
+        except Exception:
+            pass
+        col = client.create_collection(name, metadata=meta)
+
+        t0 = time.perf_counter()
+        for start in range(0, len(ids), 256):
+            col.add(ids=ids[start:start + 256], embeddings=doc_embs[start:start + 256].tolist())
+        build_s = time.perf_counter() - t0
+
+        truth = brute_force_topk(doc_embs, query_embs, k, space)
+        latencies = []
+        hits = 0
+        for q, expected in zip(query_embs, truth):
+            t0 = time.perf_counter()
+            res = col.query(query_embeddings=[q.tolist()], n_results=min(k, len(ids)), include=[])
+            latencies.append((time.perf_counter() - t0) * 1000)
+            hits += len(expected & set(res["ids"][0]))
+        lat = np.array(latencies)
+        rows.append({
+            "space": space, "M": m, "construction_ef": cef, "search_ef": sef,
+            f"recall@{k}": round(hits / (len(truth) * min(k, len(ids))), 4),
+            "p50_ms": round(float(np.percentile(lat, 50)), 3),
+            "p95_ms": round(float(np.percentile(lat, 95)), 3),
+            "build_s": round(build_s, 3),
+        })
+        client.delete_collection(name)
+    return rows
+
+
+def _ints(value):
+    return [int(x) for x in value.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure HNSW recall@k and latency against brute-force search")
+    parser.add_argument("--data", default="structured_allergy_data.json")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--space", default="cosine,l2", help="comma separated: cosine,l2,ip")
+    parser.add_argument("--M", default="8,16,32")
+    parser.add_argument("--construction-ef", default="100,200")
+    parser.add_argument("--search-ef", default="10,32,64,128")
+    parser.add_argument("--out", help="optional path to write the results as JSON")
+    args = parser.parse_args()
+
+    texts, queries = load_corpus(args.data)
+    rows = run_sweep(texts, queries, args.k, args.space.split(","), _ints(args.M),
+                     _ints(args.construction_ef), _ints(args.search_ef))
+
+    header = list(rows[0].keys())
+    print("\t".join(header))
+    for row in rows:
+        print("\t".join(str(row[h]) for h in header))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
@@ -0,0 +1,231 @@
+# llm_governor.py
+# Quota and concurrency governor in front of the Gemini client: token buckets for
+# requests/tokens per minute, a priority queue with deadlines, and deterministic shedding.
+import os
+import time
+import heapq
+import itertools
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+load_dotenv()
+
+# Budgets are per process; with serve.py divide the account quota by the worker count.
+GEMINI_RPM = float(os.environ.get("GEMINI_RPM", "60"))
+GEMINI_TPM = float(os.environ.get("GEMINI_TPM", "250000"))
+GEMINI_MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_MAX_QUEUE = int(os.environ.get("GEMINI_MAX_QUEUE", "32"))
+# tokens reserved for the answer when estimating a request's cost
+GEMINI_OUTPUT_TOKENS = int(os.environ.get("GEMINI_OUTPUT_TOKENS", "400"))
+
+# request priorities (lower is served first)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 5
+PRIORITY_BACKGROUND = 9
+
+
+class GeminiError(Exception):
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(f"Gemini API error: {status} {message}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Rejected(Exception):
+    """The governor did not let the request through; `reason` says why."""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English text, plus room for the answer
+    return len(text) // 4 + GEMINI_OUTPUT_TOKENS
+
+
+class TokenBucket:
+    """Refills continuously at `per_minute`/60 per second up to `capacity`. Not thread-safe on its own."""
+
+    def __init__(self, per_minute, capacity=None, clock=time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` can be taken (inf if it exceeds the capacity)."""
+        self._refill()
+        if amount > self.capacity:
+            return float("inf")
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.tokens -= amount
+
+    def drain(self, seconds):
+        """Empty the bucket so nothing is admitted for about `seconds` (used after a 429)."""
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class _Waiter:
+    __slots__ = ("key", "tokens", "deadline", "shed")
+
+    def __init__(self, key, tokens, deadline):
+        self.key = key
+        self.tokens = tokens
+        self.deadline = deadline
+        self.shed = False
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+
+class Governor:
+    """
+    Admission control for LLM calls. `acquire` blocks until the request may run
+    and returns a permit, or raises `Rejected`:
+      - "queue_full": the queue was full and this request ranked last
+        (priority, then arrival order) -- the same input always sheds the same request;
+      - "deadline": the budget cannot admit the request before its deadline.
+    """
+
+    def __init__(self, rpm=GEMINI_RPM, tpm=GEMINI_TPM, max_concurrency=GEMINI_MAX_CONCURRENCY,
+                 max_queue=GEMINI_MAX_QUEUE, clock=time.monotonic):
+        self.requests = TokenBucket(rpm, capacity=max(1.0, rpm / 6), clock=clock)
+        self.tokens = TokenBucket(tpm, clock=clock)
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.clock = clock
+        self.in_flight = 0
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self.stats = {"admitted": 0, "shed": 0, "deadline": 0, "throttled": 0}
+
+    def set_budget(self, rpm=None, tpm=None):
+        with self._cond:
+            if rpm:
+                self.requests = TokenBucket(rpm, capacity=max(1.0, rpm / 6), clock=self.clock)
+            if tpm:
+                self.tokens = TokenBucket(tpm, clock=self.clock)
+            self._cond.notify_all()
+
+    def _remove(self, waiter):
+        self._queue.remove(waiter)
+        heapq.heapify(self._queue)
+
+    def acquire(self, tokens, priority=PRIORITY_INTERACTIVE, deadline_s=20.0):
+        deadline = self.clock() + deadline_s
+        with self._cond:
+            waiter = _Waiter((priority, next(self._seq)), tokens, deadline)
+            if len(self._queue) >= self.max_queue:
+                worst = max(self._queue, key=lambda w: w.key)
+                if worst.key < waiter.key:
+                    self.stats["shed"] += 1
+                    raise Rejected("queue_full")
+                worst.shed = True
+                self._remove(worst)
+                self._cond.notify_all()
+            heapq.heappush(self._queue, waiter)
+            while True:
+                if waiter.shed:
+                    self.stats["shed"] += 1
+                    raise Rejected("queue_full")
+                now = self.clock()
+                head = self._queue[0] is waiter
+                if head and self.in_flight < self.max_concurrency:
+                    wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                    if wait == 0:
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        heapq.heappop(self._queue)
+                        self.in_flight += 1
+                        self.stats["admitted"] += 1
+                        self._cond.notify_all()
+                        return _Permit(self, tokens)
+                    if now + wait > waiter.deadline:
+                        # waiting cannot help: fail now instead of at the deadline
+                        self._remove(waiter)
+                        self.stats["deadline"] += 1
+                        self._cond.notify_all()
+                        raise Rejected("deadline")
+                    self._cond.wait(min(wait, waiter.deadline - now))
+                else:
+                    if now >= waiter.deadline:
+                        self._remove(waiter)
+                        self.stats["deadline"] += 1
+                        self._cond.notify_all()
+                        raise Rejected("deadline")
+                    self._cond.wait(waiter.deadline - now)
+
+    def _release(self, reserved, used=None):
+        with self._cond:
+            self.in_flight -= 1
+            if used is not None:
+                # settle the estimate against the real usage reported by the API
+                self.tokens.take(used - reserved)
+            self._cond.notify_all()
+
+    def throttle(self, retry_after=None):
+        """Called on a 429: stop admitting requests for `retry_after` seconds (default 10)."""
+        with self._cond:
+            self.stats["throttled"] += 1
+            self.requests.drain(retry_after or 10.0)
+            self._cond.notify_all()
+
+
+class _Permit:
+    def __init__(self, governor, reserved):
+        self.governor = governor
+        self.reserved = reserved
+        self.used = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.governor._release(self.reserved, self.used)
+        return False
+
+
+class AnswerCache:
+    """LRU of normalized prompt -> last good answer, used when the budget is exhausted."""
+
+    def __init__(self, max_size=2000):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(prompt):
+        return " ".join(prompt.lower().split()).rstrip("?!. ")
+
+    def get(self, prompt):
+        key = self.normalize(prompt)
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+        return None
+
+    def put(self, prompt, answer):
+        with self._lock:
+            self._data[self.normalize(prompt)] = answer
+            self._data.move_to_end(self.normalize(prompt))
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+
+governor = Governor()
+answer_cache = AnswerCache()
@@ -0,0 +1,291 @@
+# medicine_db.py
+# In-memory medicine index: finds drug names / brand aliases anywhere in a prompt
+# (word-level trie) and tolerates typos (deletion + trigram indexes).
+import os
+import re
+import csv
+import sys
+import json
+from array import array
+import numpy as np
+from dotenv import load_dotenv
+load_dotenv()
+
+MEDICINE_DB_PATH = os.environ.get("MEDICINE_DB_PATH", "data/medicines.csv")
+# words of ordinary text -- every word of the paper dataset -- are never taken for a misspelled
+# medicine ("among" is not a typo of the brand "amlong"); unset or missing disables this
+MEDICINE_VOCAB_PATH = os.environ.get("MEDICINE_VOCAB_PATH", "structured_allergy_data.json")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# common words that should never be fuzzy-matched to a drug name
+_STOPWORDS = {
+    "what", "which", "when", "where", "dose", "dosage", "tablet", "tablets", "take", "taking", "with",
+    "about", "does", "safe", "used", "uses", "side", "effects", "effect", "child", "children", "adult",
+    "adults", "much", "many", "should", "could", "would", "there", "their", "this", "that", "have",
+    "from", "medicine", "medicines", "drug", "drugs", "allergy", "allergic", "skin", "pain", "fever",
+    "after", "before", "food", "during", "pregnancy", "daily", "twice", "give", "they", "them", "your",
+}
+FUZZY_MIN_LEN = 4
+# words at least this long fall back to trigram similarity when no single-edit match exists
+TRIGRAM_MIN_LEN = 7
+TRIGRAM_MIN_SCORE = 0.6
+
+
+def normalize(text):
+    return " ".join(_TOKEN_RE.findall((text or "").lower()))
+
+
+def _trigrams(term):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _deletes(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def _edit_distance(a, b, max_dist=2):
+    """Optimal string alignment distance (adjacent transpositions count as one edit)."""
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class MedicineIndex:
+    """
+    Columnar store of medicine entries plus the lookup structures:
+      - a word-level trie {(node, word_id): child} over every normalized alias,
+        walked from each word of the prompt, so multi-word brands ("dolo 650")
+        are found anywhere in the text in O(words x alias length);
+      - for typos, a sorted NumPy array of hashed single-character deletions of
+        every alias word (finds all names one edit away with one searchsorted),
+        and a trigram -> word-id postings index for longer, noisier misspellings.
+    """
+
+    def __init__(self):
+        # entry columns
+        self.names, self.generics, self.usages, self.dosages, self.brands = [], [], [], [], []
+        # word-level trie over normalized aliases
+        self._words = {}
+        self._trie = {}
+        self._terminal = {}
+        self._next_node = 1
+        # fuzzy-matchable words (single-word aliases) and their entry
+        self.fuzzy_words = []
+        self._fuzzy_ids = {}
+        self._fuzzy_entry = array("I")
+        self._trigram_count = array("H")
+        self._postings = {}
+        # built lazily from fuzzy_words: hashed deletions (sorted) and the word each came from
+        self._delete_keys = None
+        self._delete_words = None
+        # known words of ordinary text, skipped by the typo pass of `lookup`
+        self.vocabulary = set()
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, generic="", brands=(), usage="", dosage=""):
+        entry_id = len(self.names)
+        self.names.append(name)
+        self.generics.append(generic)
+        self.usages.append(sys.intern(usage))
+        self.dosages.append(sys.intern(dosage))
+        self.brands.append(tuple(brands))
+        seen = set()
+        for alias in (name, generic, *brands):
+            alias = normalize(alias)
+            if alias and alias not in seen:
+                seen.add(alias)
+                self._add_alias(alias, entry_id)
+        return entry_id
+
+    def _add_alias(self, alias, entry_id):
+        node = 0
+        words = alias.split(" ")
+        for word in words:
+            word_id = self._words.setdefault(word, len(self._words))
+            child = self._trie.get((node, word_id))
+            if child is None:
+                child = self._trie[(node, word_id)] = self._next_node
+                self._next_node += 1
+            node = child
+        # keep the first entry that claims an alias (e.g. two products sharing a brand)
+        self._terminal.setdefault(node, entry_id)
+
+        # a word of a multi-word brand ("lacto" of "lacto calamine") does not name the medicine
+        # on its own, so only single-word aliases are matched despite typos
+        head = words[0]
+        if len(words) == 1 and len(head) >= FUZZY_MIN_LEN and head not in self._fuzzy_ids:
+            fuzzy_id = self._fuzzy_ids[head] = len(self.fuzzy_words)
+            self.fuzzy_words.append(head)
+            self._fuzzy_entry.append(entry_id)
+            grams = _trigrams(head)
+            self._trigram_count.append(min(len(grams), 65535))
+            for g in grams:
+                posting = self._postings.get(g)
+                if posting is None:
+                    posting = self._postings[g] = array("I")
+                posting.append(fuzzy_id)
+            self._delete_keys = None
+
+    def prepare(self):
+        """Build the typo index. Done lazily, or up front by `load_medicine_index`."""
+        if self._delete_keys is not None:
+            return
+        keys, owners = array("q"), array("i")
+        for fuzzy_id, word in enumerate(self.fuzzy_words):
+            for variant in _deletes(word) | {word}:
+                keys.append(hash(variant))
+                owners.append(fuzzy_id)
+        keys = np.frombuffer(keys, dtype=np.int64)
+        order = np.argsort(keys, kind="stable")
+        self._delete_keys = keys[order]
+        self._delete_words = np.frombuffer(owners, dtype=np.int32)[order]
+
+    def info(self, entry_id):
+        return {
+            "name": self.names[entry_id],
+            "generic": self.generics[entry_id],
+            "brands": list(self.brands[entry_id]),
+            "usage": self.usages[entry_id],
+            "dosage": self.dosages[entry_id],
+        }
+
+    def find_mentions(self, text):
+        """Exact (normalized) mentions in `text`: list of (entry_id, start_word, end_word)."""
+        words = normalize(text).split(" ")
+        word_ids = [self._words.get(w) for w in words]
+        found = []
+        i = 0
+        while i < len(word_ids):
+            node, best = 0, None
+            for j in range(i, len(word_ids)):
+                if word_ids[j] is None:
+                    break
+                node = self._trie.get((node, word_ids[j]))
+                if node is None:
+                    break
+                if node in self._terminal:
+                    # keep the longest alias starting at i
+                    best = (self._terminal[node], i, j + 1)
+            if best:
+                found.append(best)
+                i = best[2]
+            else:
+                i += 1
+        return found
+
+    def fuzzy_lookup(self, term, limit=3):
+        """
+        Names close to a single misspelled word: list of (entry_id, word, score), best first.
+        Candidates one edit away come from the deletion index; if there are none,
+        longer words are matched by trigram Dice similarity.
+        """
+        term = normalize(term)
+        if not self.fuzzy_words or len(term) < FUZZY_MIN_LEN:
+            return []
+        self.prepare()
+        probes = np.array([hash(v) for v in _deletes(term) | {term}], dtype=np.int64)
+        lo = np.searchsorted(self._delete_keys, probes, side="left")
+        hi = np.searchsorted(self._delete_keys, probes, side="right")
+        candidates = set()
+        for start, end in zip(lo.tolist(), hi.tolist()):
+            if start != end:
+                candidates.update(self._delete_words[start:end].tolist())
+        results = []
+        for fuzzy_id in candidates:
+            word = self.fuzzy_words[fuzzy_id]
+            dist = _edit_distance(term, word, max_dist=1)
+            if dist <= 1:
+                results.append((self._fuzzy_entry[fuzzy_id], word, round(1.0 - dist / max(len(term), len(word)), 3)))
+        if not results and len(term) >= TRIGRAM_MIN_LEN:
+            results = self._trigram_lookup(term, limit)
+        results.sort(key=lambda r: -r[2])
+        return results[:limit]
+
+    def _trigram_lookup(self, term, limit):
+        grams = _trigrams(term)
+        postings = [np.frombuffer(self._postings[g], dtype=np.uint32) for g in grams if g in self._postings]
+        if not postings:
+            return []
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.fuzzy_words))
+        sizes = np.frombuffer(self._trigram_count, dtype=np.uint16)
+        dice = 2.0 * shared / (len(grams) + sizes)
+        top = np.argpartition(-dice, min(limit, len(dice) - 1))[:limit]
+        return [(self._fuzzy_entry[i], self.fuzzy_words[i], round(float(dice[i]), 3))
+                for i in top.tolist() if dice[i] >= TRIGRAM_MIN_SCORE]
+
+    def lookup(self, text, limit=3):
+        """
+        Medicines mentioned in free text. Exact alias mentions first, then typo
+        matches for the remaining words that are not ordinary vocabulary. Returns structured info dicts with
+        "matched" (the alias found) and "fuzzy" flags.
+        """
+        words = normalize(text).split(" ")
+        results, seen, covered = [], set(), set()
+        for entry_id, start, end in self.find_mentions(text):
+            covered.update(range(start, end))
+            if entry_id not in seen:
+                seen.add(entry_id)
+                results.append(dict(self.info(entry_id), matched=" ".join(words[start:end]), fuzzy=False))
+        for i, word in enumerate(words):
+            if len(results) >= limit:
+                break
+            if (i in covered or len(word) < FUZZY_MIN_LEN or word in _STOPWORDS or word in self.vocabulary
+                    or word.isdigit()):
+                continue
+            for entry_id, match, score in self.fuzzy_lookup(word, limit=1):
+                if entry_id not in seen:
+                    seen.add(entry_id)
+                    results.append(dict(self.info(entry_id), matched=match, fuzzy=True, score=score))
+        return results[:limit]
+
+
+def load_vocabulary(path=MEDICINE_VOCAB_PATH):
+    """Every normalized word in the text fields of a JSON list of records (empty if there is no file)."""
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    words = set()
+    for rec in records:
+        for value in rec.values():
+            if isinstance(value, str):
+                words.update(_TOKEN_RE.findall(value.lower()))
+    return words
+
+
+def load_medicine_index(path=MEDICINE_DB_PATH, vocabulary_path=MEDICINE_VOCAB_PATH):
+    """
+    Build the index from a CSV with columns name, generic, brands, usage, dosage
+    (brands separated by "|"). Words of the records in `vocabulary_path` are never
+    fuzzy-matched.
+    """
+    index = MedicineIndex()
+    index.vocabulary = load_vocabulary(vocabulary_path)
+    with open(path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            brands = [b.strip() for b in (row.get("brands") or "").split("|") if b.strip()]
+            index.add(row["name"], row.get("generic", ""), brands, row.get("usage", ""), row.get("dosage", ""))
+    index.prepare()
+    return index
+
+
+_index = None
+
+
+def get_medicine_index():
+    global _index
+    if _index is None:
+        _index = load_medicine_index()
+    return _index
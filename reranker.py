@@ -0,0 +1,135 @@
+# reranker.py
+# Optional cross-encoder reranking of retrieved passages under a latency budget.
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from dotenv import load_dotenv
+load_dotenv()
+
+RERANK_ENABLED = os.environ.get("RERANK_ENABLED", "0") == "1"
+RERANK_MODEL = os.environ.get("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.environ.get("RERANK_CANDIDATES", "50"))
+RERANK_TOP_K = int(os.environ.get("RERANK_TOP_K", "3"))
+RERANK_BUDGET_MS = float(os.environ.get("RERANK_BUDGET_MS", "150"))
+RERANK_BATCH_SIZE = int(os.environ.get("RERANK_BATCH_SIZE", "16"))
+RERANK_CACHE_SIZE = int(os.environ.get("RERANK_CACHE_SIZE", "20000"))
+
+
+@lru_cache(maxsize=None)
+def get_cross_encoder():
+    from sentence_transformers import CrossEncoder
+
+    # small MiniLM cross-encoder, runs fine on CPU
+    return CrossEncoder(RERANK_MODEL, device="cpu")
+
+
+# after a failed model load (offline, bad RERANK_MODEL) requests use vector order this long before a retry
+RERANK_LOAD_RETRY_S = float(os.environ.get("RERANK_LOAD_RETRY_S", "60"))
+
+_model = None
+_load_failed_at = None
+_loader = None
+_loader_lock = threading.Lock()
+
+
+def _load():
+    global _model, _load_failed_at
+    try:
+        _model = get_cross_encoder()
+    except Exception as e:
+        _load_failed_at = time.monotonic()
+        print("Could not load the reranker model:", e)
+
+
+def _cross_encoder_by(deadline):
+    """
+    The cross-encoder if it is loaded (or finishes loading) before `deadline`, else None.
+    A lazy load runs in a background thread, so a slow first load costs one request's
+    budget instead of blocking it; a failed load is retried after RERANK_LOAD_RETRY_S.
+    """
+    global _loader
+    with _loader_lock:
+        # a finished loader that left no model has failed (and set _load_failed_at)
+        if _model is None and not (_loader and _loader.is_alive()):
+            if _loader is None or time.monotonic() - _load_failed_at >= RERANK_LOAD_RETRY_S:
+                _loader = threading.Thread(target=_load, daemon=True)
+                _loader.start()
+        loader = _loader
+    if _model is None and loader is not None:
+        loader.join(max(0.0, deadline - time.perf_counter()))
+    return _model
+
+
+class ScoreCache:
+    """Thread-safe LRU of (query, passage) -> cross-encoder score."""
+
+    def __init__(self, max_size=RERANK_CACHE_SIZE):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query, document):
+        digest = hashlib.sha1((document or "").encode("utf-8")).hexdigest()
+        return (query.strip().lower(), digest)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+        return None
+
+    def put(self, key, score):
+        with self._lock:
+            self._data[key] = score
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+
+score_cache = ScoreCache()
+
+
+def rerank(query, hits, top_k=RERANK_TOP_K, budget_ms=RERANK_BUDGET_MS, batch_size=RERANK_BATCH_SIZE):
+    """
+    Re-order vector store `hits` by cross-encoder score and keep the best `top_k`.
+    Pairs are scored in batches; the vector order is returned instead if the model is
+    not loaded within `budget_ms`, if the next batch would not finish inside it
+    (estimated from the previous batch), or if a batch has overrun it. Scores computed
+    before giving up stay cached for the next request.
+    """
+    if not hits:
+        return []
+    deadline = time.perf_counter() + budget_ms / 1000.0
+
+    scores = [None] * len(hits)
+    keys = [score_cache.key(query, hit["document"]) for hit in hits]
+    pending = []
+    for i, key in enumerate(keys):
+        scores[i] = score_cache.get(key)
+        if scores[i] is None:
+            pending.append(i)
+
+    model = _cross_encoder_by(deadline) if pending else None
+    if pending and model is None:
+        return hits[:top_k]
+    last_batch_s = 0.0
+    for start in range(0, len(pending), batch_size):
+        if time.perf_counter() + last_batch_s > deadline:
+            return hits[:top_k]
+        batch = pending[start:start + batch_size]
+        t0 = time.perf_counter()
+        batch_scores = model.predict([(query, hits[i]["document"] or "") for i in batch], batch_size=len(batch))
+        last_batch_s = time.perf_counter() - t0
+        for i, score in zip(batch, batch_scores):
+            scores[i] = float(score)
+            score_cache.put(keys[i], scores[i])
+        if time.perf_counter() > deadline:
+            return hits[:top_k]
+
+    order = sorted(range(len(hits)), key=lambda i: scores[i], reverse=True)
+    return [dict(hits[i], rerank_score=scores[i]) for i in order[:top_k]]
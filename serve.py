@@ -0,0 +1,103 @@
+# serve.py
+# Production server: gunicorn with several worker processes sharing preloaded models.
+# (gunicorn needs Linux/macOS/WSL; on Windows use `python app.py` for development.)
+import os
+import gc
+import argparse
+from dotenv import load_dotenv
+from gunicorn.app.base import BaseApplication
+from vector_store import VECTOR_BACKEND
+load_dotenv()
+
+
+class MedicalAssistantServer(BaseApplication):
+    def __init__(self, application, options):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def _post_fork(server, worker):
+    # each worker gets its own small intra-op pool instead of all workers fighting over every core
+    try:
+        import torch
+
+        torch.set_num_threads(int(os.environ.get("TORCH_THREADS_PER_WORKER", "1")))
+    except ImportError:
+        pass
+    if not _STORE_PRELOADED:
+        from gemini_api import get_store
+
+        get_store()
+    # precompute answers to the most frequent questions; /ready reports 503 until done
+    from warmup import warmup
+
+    warmup.ensure_started()
+
+
+# The NumPy index is a read-only memory map and is safe to load before forking.
+# A Chroma client holds SQLite connections and threads, so each worker opens its own.
+_STORE_PRELOADED = VECTOR_BACKEND == "numpy"
+# sessions shared by the workers when SESSION_DB_PATH is not set
+_DEFAULT_SESSION_DB = "sessions.db"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Medical Assistant with gunicorn")
+    parser.add_argument("--bind", default=os.environ.get("BIND", "0.0.0.0:5000"))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_WORKERS", "2")))
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("WEB_THREADS", "4")),
+                        help="request threads per worker (most time is spent waiting on Gemini)")
+    parser.add_argument("--timeout", type=int, default=int(os.environ.get("WEB_TIMEOUT", "60")),
+                        help="seconds before a stuck worker is killed and replaced")
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="seconds in-flight requests get to finish on reload/shutdown")
+    parser.add_argument("--max-requests", type=int, default=0, help="recycle workers after N requests (0 = never)")
+    parser.add_argument("--pid", default=None, help="pidfile; `kill -HUP $(cat pidfile)` reloads workers gracefully")
+    args = parser.parse_args()
+
+    # in-memory sessions are per worker: follow-ups routed to another worker would lose their history
+    if args.workers > 1 and not os.environ.get("SESSION_DB_PATH"):
+        os.environ["SESSION_DB_PATH"] = _DEFAULT_SESSION_DB
+        print(f"{args.workers} workers: keeping sessions in SQLite at {_DEFAULT_SESSION_DB} (set SESSION_DB_PATH to move it)")
+
+    # Import the app and load the embedder / vector index in the master process.
+    # Workers are forked afterwards and share these pages copy-on-write.
+    from app import app
+    from gemini_api import preload
+    from index_config import serving_db_path
+
+    # unpack CHROMA_SNAPSHOT (if set) once here; workers inherit the resolved path
+    serving_db_path()
+    preload(include_store=_STORE_PRELOADED)
+    # move everything loaded so far out of the GC's tracked generations so
+    # collections in the workers don't touch (and copy) the shared pages
+    gc.freeze()
+
+    options = {
+        "bind": args.bind,
+        "workers": args.workers,
+        "threads": args.threads,
+        "worker_class": "gthread",
+        "timeout": args.timeout,
+        "graceful_timeout": args.graceful_timeout,
+        "max_requests": args.max_requests,
+        "max_requests_jitter": args.max_requests // 10 if args.max_requests else 0,
+        "preload_app": True,
+        "pidfile": args.pid,
+        "post_fork": _post_fork,
+        "accesslog": "-",
+    }
+    MedicalAssistantServer(app, options).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+# sessions.py
+# Per-user conversation history with hard memory caps, rolling summaries and
+# follow-up query rewriting for retrieval.
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+load_dotenv()
+
+SESSION_MAX_SESSIONS = int(os.environ.get("SESSION_MAX_SESSIONS", "5000"))
+# recent turns kept verbatim; older ones are folded into the summary
+SESSION_MAX_TURNS = int(os.environ.get("SESSION_MAX_TURNS", "4"))
+SESSION_MAX_CHARS = int(os.environ.get("SESSION_MAX_CHARS", "6000"))
+SESSION_SUMMARY_CHARS = int(os.environ.get("SESSION_SUMMARY_CHARS", "1200"))
+# total characters held by the in-memory store across all sessions
+SESSION_PROCESS_MAX_CHARS = int(os.environ.get("SESSION_PROCESS_MAX_CHARS", "20000000"))
+SESSION_TTL_SECONDS = int(os.environ.get("SESSION_TTL_SECONDS", str(24 * 3600)))
+# set to a file path to keep sessions in SQLite (shared by all server workers)
+SESSION_DB_PATH = os.environ.get("SESSION_DB_PATH")
+
+_SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+_FOLLOW_UP_RE = re.compile(
+    r"^(and|also|what about|how about|but|so|then|same|ok|okay)\b|\b(it|its|they|them|their|this|that|these|those)\b",
+    re.IGNORECASE)
+
+
+def valid_session_id(session_id):
+    return isinstance(session_id, str) and bool(_SESSION_ID_RE.match(session_id))
+
+
+def _new_session():
+    return {"summary": "", "turns": [], "updated": time.time()}
+
+
+def _size(session):
+    return len(session["summary"]) + sum(len(q) + len(a) for q, a in session["turns"])
+
+
+def _first_sentence(text, limit=160):
+    text = " ".join((text or "").split())
+    cut = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+    return cut[:limit].rstrip() + ("…" if len(cut) > limit else "")
+
+
+def compact(session):
+    """
+    Fold the oldest turns into the rolling summary until the session is within
+    SESSION_MAX_TURNS and SESSION_MAX_CHARS. The summary keeps each old question
+    and the first sentence of its answer, and drops its oldest lines when full.
+    """
+    while session["turns"] and (len(session["turns"]) > SESSION_MAX_TURNS or _size(session) > SESSION_MAX_CHARS):
+        question, answer = session["turns"].pop(0)
+        line = f"Q: {_first_sentence(question, 200)} A: {_first_sentence(answer)}"
+        lines = [ln for ln in session["summary"].split("\n") if ln] + [line]
+        while len("\n".join(lines)) > SESSION_SUMMARY_CHARS and len(lines) > 1:
+            lines.pop(0)
+        session["summary"] = "\n".join(lines)[-SESSION_SUMMARY_CHARS:]
+    return session
+
+
+class MemorySessionBackend:
+    """LRU of sessions, capped by session count and total characters."""
+
+    def __init__(self, max_sessions=SESSION_MAX_SESSIONS, max_chars=SESSION_PROCESS_MAX_CHARS):
+        self.max_sessions = max_sessions
+        self.max_chars = max_chars
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._total = 0
+        self._lock = threading.Lock()
+        # serializes read-modify-write updates so concurrent turns are not lost
+        self._update_lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._data.get(session_id)
+            if session is not None:
+                self._data.move_to_end(session_id)
+                return json.loads(json.dumps(session))
+        return None
+
+    def put(self, session_id, session):
+        size = _size(session)
+        with self._lock:
+            self._total += size - self._sizes.get(session_id, 0)
+            self._data[session_id] = session
+            self._sizes[session_id] = size
+            self._data.move_to_end(session_id)
+            while self._data and (len(self._data) > self.max_sessions or self._total > self.max_chars):
+                old_id, _ = self._data.popitem(last=False)
+                self._total -= self._sizes.pop(old_id)
+
+    def update(self, session_id, change):
+        """Store `change(session or None)` in place of the session, atomically within this process."""
+        with self._update_lock:
+            session = change(self.get(session_id))
+            self.put(session_id, session)
+        return session
+
+    def delete(self, session_id):
+        with self._lock:
+            if self._data.pop(session_id, None) is not None:
+                self._total -= self._sizes.pop(session_id)
+
+
+class SqliteSessionBackend:
+    """Sessions in a SQLite file, capped by row count (least recently updated evicted first)."""
+
+    def __init__(self, path, max_sessions=SESSION_MAX_SESSIONS):
+        self.path = path
+        self.max_sessions = max_sessions
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT, updated REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated)")
+
+    def _conn(self):
+        # one connection per thread (and per forked worker, since it is opened lazily)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, session_id):
+        row = self._conn().execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write(self, conn, session_id, session):
+        conn.execute("INSERT OR REPLACE INTO sessions (id, data, updated) VALUES (?, ?, ?)",
+                     (session_id, json.dumps(session, ensure_ascii=False), session["updated"]))
+        conn.execute("DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY updated DESC "
+                     "LIMIT -1 OFFSET ?)", (self.max_sessions,))
+
+    def put(self, session_id, session):
+        with self._conn() as conn:
+            self._write(conn, session_id, session)
+
+    def update(self, session_id, change):
+        """Store `change(session or None)` in place of the session in one write transaction."""
+        conn = self._conn()
+        with conn:
+            # take the write lock before reading, so concurrent turns (from any worker) queue up
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            session = change(json.loads(row[0]) if row else None)
+            self._write(conn, session_id, session)
+        return session
+
+    def delete(self, session_id):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+
+class SessionStore:
+    def __init__(self, backend):
+        self.backend = backend
+
+    @staticmethod
+    def _live(session):
+        if session is None or time.time() - session["updated"] > SESSION_TTL_SECONDS:
+            return _new_session()
+        return session
+
+    def get(self, session_id):
+        return self._live(self.backend.get(session_id))
+
+    def append(self, session_id, question, answer):
+        def add_turn(session):
+            session = self._live(session)
+            session["turns"].append([question, answer])
+            session["updated"] = time.time()
+            return compact(session)
+
+        return self.backend.update(session_id, add_turn)
+
+    def clear(self, session_id):
+        self.backend.delete(session_id)
+
+
+def history_text(session):
+    """Conversation context for the LLM prompt: rolling summary plus recent turns."""
+    parts = []
+    if session["summary"]:
+        parts.append("Earlier in this conversation:\n" + session["summary"])
+    for question, answer in session["turns"]:
+        parts.append(f"User: {question}\nAssistant: {answer}")
+    return "\n\n".join(parts)
+
+
+def rewrite_query(session, prompt):
+    """
+    Retrieval query for `prompt`. Short or referential follow-ups ("and for children?",
+    "is it safe?") are expanded with the previous question so retrieval keeps the topic.
+    """
+    if not session["turns"]:
+        return prompt
+    if len(prompt.split()) > 8 and not _FOLLOW_UP_RE.search(prompt):
+        return prompt
+    previous = session["turns"][-1][0]
+    return f"{previous} {prompt}"
+
+
+_store = None
+
+
+def get_session_store():
+    global _store
+    if _store is None:
+        backend = SqliteSessionBackend(SESSION_DB_PATH) if SESSION_DB_PATH else MemorySessionBackend()
+        _store = SessionStore(backend)
+    return _store
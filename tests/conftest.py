@@ -0,0 +1,10 @@
+# conftest.py
+# The app modules live at the repository root and the pipeline modules in
+# data_extraction_pipline/ (run as scripts from there), so both go on sys.path.
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "data_extraction_pipline")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,58 @@
+from dedupe import dedupe_records, find_duplicates, match_existing, normalize_doi, normalize_title
+
+ABSTRACT = ("Contact dermatitis is a common skin condition in India. We patch tested four hundred patients "
+            "attending a tertiary care centre in south India with the Indian standard series and found that "
+            "nickel, parthenium and fragrance mix were the most frequent allergens, with a marked difference "
+            "between men and women and between rural and urban patients over the five year study period.")
+
+
+def test_normalizers():
+    assert normalize_doi("https://doi.org/10.1000/ABC") == "10.1000/abc"
+    assert normalize_doi("doi: 10.1000/abc") == "10.1000/abc"
+    assert normalize_doi("") is None
+    assert normalize_title("Nickel Allergy in Kérala.") == "nickel allergy in kerala"
+
+
+def test_same_paper_from_both_sources_is_merged_with_provenance():
+    records = [
+        {"title": "Patch testing in South India", "source": "semantic_scholar", "paperId": "ss1",
+         "externalIds": {"DOI": "10.1/X"}, "abstract": "short", "year": 2020},
+        {"title": "Patch testing in south India.", "source": "pubmed", "pmid": "111", "doi": "10.1/x",
+         "abstract": "a longer abstract", "year": 2020},
+    ]
+    canonical, stats = dedupe_records(records)
+    assert len(canonical) == 1
+    merged = canonical[0]
+    assert merged["source"] == "pubmed"
+    assert merged["abstract"] == "a longer abstract"
+    assert merged["sources"] == [{"source": "pubmed", "id": "111"}, {"source": "semantic_scholar", "id": "ss1"}]
+    assert "doi" in merged["merged_by"]
+    assert stats["input"] == 2 and stats["output"] == 1
+
+
+def test_same_title_years_apart_is_not_merged():
+    records = [{"title": "Urticaria in Indian children: a review", "year": 2010},
+               {"title": "Urticaria in Indian children: a review", "year": 2020},
+               {"title": "Urticaria in Indian children: a review", "year": 2011}]
+    groups, reasons = find_duplicates(records)
+    assert groups == [[0, 2], [1]]
+    assert reasons[0] == ["title"]
+
+
+def test_near_duplicate_abstracts_are_merged():
+    edited = ABSTRACT.replace("four hundred", "four hundred and ten")
+    records = [{"title": "Patch test study", "abstract": ABSTRACT},
+               {"title": "A different title altogether", "abstract": edited},
+               {"title": "Unrelated", "abstract": " ".join(reversed(ABSTRACT.split()))}]
+    groups, reasons = find_duplicates(records)
+    assert groups == [[0, 1], [2]]
+    assert reasons[0] == ["abstract"]
+
+
+def test_match_existing_by_id_or_title():
+    corpus = [{"id": "p1", "title": "Nickel allergy among Indian women", "pmid": "42"},
+              {"id": "p2", "title": "Parthenium dermatitis revisited"}]
+    records = [{"title": "Something else", "pmid": "42"},
+               {"title": "PARTHENIUM dermatitis, revisited"},
+               {"title": "A new paper about urticaria"}]
+    assert match_existing(records, corpus) == ["p1", "p2", None]
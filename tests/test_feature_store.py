@@ -0,0 +1,49 @@
+import numpy as np
+from feature_store import FeatureStore
+
+RECORDS = [
+    {"id": "p1", "title": "Nickel dermatitis in Kerala", "year": "2019", "source": "pubmed",
+     "conditions": ["contact dermatitis"], "allergens": ["nickel", "Nickel", "cobalt"], "regions": ["Kerala"],
+     "prevalence_percent": [12.5]},
+    {"id": "p2", "title": "Parthenium in Karnataka", "year": 2015, "source": "semantic_scholar",
+     "conditions": ["contact dermatitis"], "allergens": ["parthenium"], "regions": ["Karnataka"]},
+    {"id": "p3", "title": "Food allergy in children", "year": None, "source": "pubmed",
+     "conditions": ["urticaria"], "food_triggers": ["peanut"], "allergens": ["nickel"], "regions": ["kerala"]},
+]
+
+
+def test_queries_combine_fields_with_and_and_terms_with_or():
+    store = FeatureStore.from_records(RECORDS)
+    assert store.query(allergens=["nickel"]).tolist() == [0, 2]
+    assert store.query(allergens="nickel", regions="KERALA").tolist() == [0, 2]
+    assert store.query(allergens=["parthenium", "cobalt"]).tolist() == [0, 1]
+    assert store.query(match_any=True, food_triggers="peanut", regions="Karnataka").tolist() == [1, 2]
+    assert store.count(allergens="unknown") == 0
+    assert store.count() == 3
+
+
+def test_year_range_excludes_unknown_years():
+    store = FeatureStore.from_records(RECORDS)
+    assert store.query(year_from=2016).tolist() == [0]
+    assert store.query(year_to=2016).tolist() == [1]
+
+
+def test_term_counts_most_frequent_first():
+    store = FeatureStore.from_records(RECORDS)
+    assert store.term_counts("allergens") == {"nickel": 2, "cobalt": 1, "parthenium": 1}
+    assert store.term_counts("allergens", conditions="contact dermatitis") == {
+        "nickel": 1, "cobalt": 1, "parthenium": 1}
+
+
+def test_records_survive_a_save_and_load(tmp_path):
+    path = str(tmp_path / "features.npz")
+    FeatureStore.from_records(RECORDS).save(path)
+    store = FeatureStore.load(path)
+    assert len(store) == 3
+    rec = store.get("p1")
+    assert rec.allergens == ["nickel", "cobalt"]  # a term is listed once per document
+    assert rec.prevalence_percent == [12.5]
+    assert rec.year == 2019
+    assert store.get(2).year is None
+    assert store.get(2).food_triggers == ["peanut"]
+    assert np.array_equal(store.query(regions="kerala"), [0, 2])
@@ -0,0 +1,79 @@
+import io
+import json
+import tarfile
+import multiprocessing
+import pytest
+from index_config import SNAPSHOT_MANIFEST, _file_sha256, load_snapshot
+
+
+def _snapshot(path, files, extra=None):
+    """A snapshot archive holding `files` ({relative path: bytes}) and their manifest."""
+    src = path.parent / (path.name + ".src")
+    checksums = {}
+    with tarfile.open(path, "w:gz") as tar:
+        for rel, data in files.items():
+            (src / rel).parent.mkdir(parents=True, exist_ok=True)
+            (src / rel).write_bytes(data)
+            checksums[rel] = _file_sha256(src / rel)
+            tar.add(src / rel, arcname=rel)
+        for member in extra or []:
+            tar.addfile(member)
+        manifest = json.dumps({"created": 0, "collections": {"allergy": {}}, "files": checksums}).encode()
+        info = tarfile.TarInfo(SNAPSHOT_MANIFEST)
+        info.size = len(manifest)
+        tar.addfile(info, io.BytesIO(manifest))
+    return path
+
+
+def test_load_unpacks_once_and_replaces_a_different_snapshot(tmp_path):
+    target = tmp_path / "serving"
+    first = _snapshot(tmp_path / "a.tar.gz", {"chroma.sqlite3": b"one", "numpy/x/docs.json": b"{}"})
+    manifest = load_snapshot(first, target)
+    assert (target / "chroma.sqlite3").read_bytes() == b"one"
+    assert load_snapshot(first, target) == manifest
+    second = _snapshot(tmp_path / "b.tar.gz", {"chroma.sqlite3": b"two"})
+    load_snapshot(second, target)
+    assert (target / "chroma.sqlite3").read_bytes() == b"two"
+    assert not (target / "numpy").exists()
+    assert not (tmp_path / "serving.lock").exists()
+
+
+@pytest.mark.parametrize("kind", [tarfile.SYMTYPE, tarfile.LNKTYPE])
+def test_link_members_are_refused(tmp_path, kind):
+    link = tarfile.TarInfo("evil")
+    link.type = kind
+    link.linkname = "/etc/passwd"
+    archive = _snapshot(tmp_path / "a.tar.gz", {"chroma.sqlite3": b"one"}, extra=[link])
+    with pytest.raises(ValueError, match="Unsupported member"):
+        load_snapshot(archive, tmp_path / "serving")
+    assert not (tmp_path / "serving").exists()
+
+
+def test_checksum_mismatch_is_refused(tmp_path):
+    archive = _snapshot(tmp_path / "a.tar.gz", {"chroma.sqlite3": b"one"})
+    with tarfile.open(archive, "r:gz") as tar:
+        manifest = json.load(tar.extractfile(SNAPSHOT_MANIFEST))
+    manifest["files"]["chroma.sqlite3"] = "0" * 64
+    with tarfile.open(tmp_path / "bad.tar.gz", "w:gz") as tar:
+        tar.add(tmp_path / "a.tar.gz.src" / "chroma.sqlite3", arcname="chroma.sqlite3")
+        data = json.dumps(manifest).encode()
+        info = tarfile.TarInfo(SNAPSHOT_MANIFEST)
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+    with pytest.raises(ValueError, match="checksum"):
+        load_snapshot(tmp_path / "bad.tar.gz", tmp_path / "serving")
+
+
+def _load(args):
+    archive, target = args
+    return load_snapshot(archive, target)["files"]
+
+
+def test_concurrent_loaders_replace_an_old_snapshot_safely(tmp_path):
+    target = tmp_path / "serving"
+    load_snapshot(_snapshot(tmp_path / "old.tar.gz", {"chroma.sqlite3": b"old"}), target)
+    archive = _snapshot(tmp_path / "new.tar.gz", {"chroma.sqlite3": b"new" * 100000})
+    with multiprocessing.get_context("fork").Pool(6) as pool:
+        results = pool.map(_load, [(archive, target)] * 6)
+    assert all(r == results[0] for r in results)
+    assert (target / "chroma.sqlite3").read_bytes() == b"new" * 100000
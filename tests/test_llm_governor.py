@@ -0,0 +1,145 @@
+import time
+import threading
+import pytest
+from llm_governor import Governor, Rejected, TokenBucket, PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_BACKGROUND
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def _governor(clock, **budget):
+    params = dict(rpm=600, tpm=1_000_000, max_concurrency=1, max_queue=8)
+    params.update(budget)
+    return Governor(clock=clock, **params)
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def _queue_in_background(gov, priority, outcomes, name):
+    """Start an acquire() that has to queue; returns once it is in the governor's queue."""
+    newest = max((w.key[1] for w in gov._queue), default=-1)
+
+    def run():
+        try:
+            with gov.acquire(10, priority=priority, deadline_s=3600):
+                outcomes.append(name)
+        except Rejected as e:
+            outcomes.append(f"{name}:{e.reason}")
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    _wait_until(lambda: any(w.key[1] > newest for w in gov._queue))
+    return thread
+
+
+def test_token_bucket_refills_with_the_clock():
+    clock = FakeClock()
+    bucket = TokenBucket(60, capacity=2, clock=clock)
+    bucket.take(2)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.advance(1.0)
+    assert bucket.wait_time(1) == 0.0
+    assert bucket.wait_time(3) == float("inf")
+
+
+def test_queued_requests_are_admitted_by_priority_then_arrival():
+    clock = FakeClock()
+    gov = _governor(clock)
+    outcomes = []
+    held = gov.acquire(10)
+    threads = [
+        _queue_in_background(gov, PRIORITY_BACKGROUND, outcomes, "background"),
+        _queue_in_background(gov, PRIORITY_BATCH, outcomes, "batch-1"),
+        _queue_in_background(gov, PRIORITY_INTERACTIVE, outcomes, "interactive"),
+        _queue_in_background(gov, PRIORITY_BATCH, outcomes, "batch-2"),
+    ]
+    with held:
+        pass
+    for thread in threads:
+        thread.join(5)
+    assert outcomes == ["interactive", "batch-1", "batch-2", "background"]
+    assert gov.stats["admitted"] == 5
+
+
+def test_full_queue_sheds_the_lowest_ranked_request():
+    clock = FakeClock()
+    gov = _governor(clock, max_queue=2)
+    outcomes = []
+    held = gov.acquire(10)
+    first = _queue_in_background(gov, PRIORITY_BACKGROUND, outcomes, "background-1")
+    second = _queue_in_background(gov, PRIORITY_BACKGROUND, outcomes, "background-2")
+
+    # an interactive request pushes out the latest background one ...
+    third = _queue_in_background(gov, PRIORITY_INTERACTIVE, outcomes, "interactive")
+    second.join(5)
+    assert outcomes == ["background-2:queue_full"]
+    # ... and a new background request ranks last, so it is the one rejected
+    with pytest.raises(Rejected) as excinfo:
+        gov.acquire(10, priority=PRIORITY_BACKGROUND)
+    assert excinfo.value.reason == "queue_full"
+
+    with held:
+        pass
+    first.join(5)
+    third.join(5)
+    assert outcomes == ["background-2:queue_full", "interactive", "background-1"]
+    assert gov.stats["shed"] == 2
+
+
+def test_request_that_cannot_be_admitted_before_its_deadline_fails_fast():
+    clock = FakeClock()
+    gov = _governor(clock, rpm=6)  # one request per 10 s, bucket of one
+    with gov.acquire(10):
+        pass
+    t0 = time.monotonic()
+    with pytest.raises(Rejected) as excinfo:
+        gov.acquire(10, deadline_s=5)
+    assert excinfo.value.reason == "deadline"
+    assert time.monotonic() - t0 < 1.0
+    assert gov.stats["deadline"] == 1
+    clock.advance(10)
+    with gov.acquire(10, deadline_s=5):
+        pass
+
+
+def test_throttle_stops_admission_for_retry_after():
+    clock = FakeClock()
+    gov = _governor(clock, rpm=60)
+    gov.throttle(retry_after=30)
+    assert gov.stats["throttled"] == 1
+    with pytest.raises(Rejected) as excinfo:
+        gov.acquire(10, deadline_s=20)
+    assert excinfo.value.reason == "deadline"
+    clock.advance(31)
+    with gov.acquire(10, deadline_s=20):
+        pass
+
+
+def test_release_settles_reserved_against_used_tokens():
+    clock = FakeClock()
+    gov = _governor(clock, tpm=1000)
+    with gov.acquire(400) as permit:
+        assert gov.tokens.tokens == 600
+        permit.used = 100
+    assert gov.tokens.tokens == pytest.approx(900)
+    with gov.acquire(400) as permit:
+        permit.used = 700
+    assert gov.tokens.tokens == pytest.approx(200)
+    # without a reported usage the reservation stands
+    with gov.acquire(100):
+        pass
+    assert gov.tokens.tokens == pytest.approx(100)
+    assert gov.in_flight == 0
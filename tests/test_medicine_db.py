@@ -0,0 +1,82 @@
+import os
+import pytest
+from medicine_db import MedicineIndex, load_medicine_index, _edit_distance
+
+DATA = os.path.join(os.path.dirname(__file__), "..")
+
+
+@pytest.fixture
+def index():
+    index = MedicineIndex()
+    index.add("Paracetamol", "paracetamol", ["Crocin", "Dolo 650", "Calpol"], "Pain relief and fever", "500mg")
+    index.add("Cetirizine", "cetirizine", ["Cetzine", "Okacet"], "Antihistamine", "10mg")
+    index.add("Betamethasone", "betamethasone", ["Betnovate"], "Topical steroid", "0.1%")
+    return index
+
+
+def test_edit_distance_counts_a_transposition_as_one_edit():
+    assert _edit_distance("cetirizine", "cetiriizne") == 1
+    assert _edit_distance("crocin", "crocin") == 0
+    assert _edit_distance("abc", "abcdef") == 3
+
+
+def test_multi_word_brand_is_found_anywhere_in_the_prompt(index):
+    results = index.lookup("can my son take Dolo-650 twice a day?")
+    assert [(r["name"], r["matched"], r["fuzzy"]) for r in results] == [("Paracetamol", "dolo 650", False)]
+
+
+def test_each_medicine_is_reported_once(index):
+    results = index.lookup("crocin or paracetamol with cetirizine")
+    assert [r["name"] for r in results] == ["Paracetamol", "Cetirizine"]
+
+
+def test_typos_are_matched_by_single_edit_and_by_trigrams(index):
+    (hit,) = index.lookup("is cetrizine safe")
+    assert (hit["name"], hit["fuzzy"], hit["matched"]) == ("Cetirizine", True, "cetirizine")
+    assert index.fuzzy_lookup("betamethazone")[0][:2] == (2, "betamethasone")
+    assert index.fuzzy_lookup("betamethsaone")[0][0] == 2
+
+
+def test_stopwords_and_short_words_are_not_fuzzy_matched(index):
+    assert index.lookup("what dose for fever") == []
+    assert index.fuzzy_lookup("cet") == []
+
+
+def test_words_of_multi_word_brands_are_not_fuzzy_matched(index):
+    index.add("Calamine", "calamine", ["Lacto Calamine"], "Soothing itchy skin", "Apply topically")
+    assert index.lookup("is lactose intolerance an allergy") == []
+    assert index.lookup("lacto calamine for itching")[0]["name"] == "Calamine"
+    assert index.lookup("calamin lotion")[0]["name"] == "Calamine"
+
+
+@pytest.fixture(scope="module")
+def bundled():
+    return load_medicine_index(os.path.join(DATA, "data", "medicines.csv"),
+                               os.path.join(DATA, "structured_allergy_data.json"))
+
+
+def test_bundled_medicine_list_loads(bundled):
+    assert len(bundled) > 0
+    assert bundled.lookup("dolo 650")[0]["name"] == "Paracetamol"
+
+
+@pytest.mark.parametrize("prompt", [
+    "Is eczema common among children in India?",   # "among" is one edit from the brand "amlong"
+    "Do rashes spread along the arms?",
+    "Can electronic devices cause contact dermatitis?",  # "electral" (oral rehydration salts)
+    "Electrical burns and skin allergy",
+    "augmented immune response to nickel",  # "augmentin"
+])
+def test_ordinary_words_are_not_taken_for_misspelled_medicines(bundled, prompt):
+    assert bundled.lookup(prompt) == []
+
+
+def test_misspelled_medicines_are_still_found(bundled):
+    assert bundled.lookup("is montelukst safe?")[0]["name"] == "Montelukast"
+    assert bundled.lookup("augmentn dose for kids")[0]["matched"] == "augmentin"
+
+
+def test_vocabulary_words_are_skipped_by_the_typo_pass(index):
+    assert index.lookup("cetrizine")[0]["name"] == "Cetirizine"
+    index.vocabulary = {"cetrizine"}
+    assert index.lookup("cetrizine") == []
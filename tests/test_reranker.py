@@ -0,0 +1,68 @@
+import time
+import pytest
+import reranker
+
+HITS = [{"id": str(i), "document": "x" * i} for i in range(40)]
+
+
+class FakeCrossEncoder:
+    def __init__(self, batch_s=0.0):
+        self.batch_s = batch_s
+
+    def predict(self, pairs, batch_size=None):
+        time.sleep(self.batch_s)
+        return [len(doc) for _, doc in pairs]
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(reranker, "_model", None)
+    monkeypatch.setattr(reranker, "_loader", None)
+    monkeypatch.setattr(reranker, "_load_failed_at", None)
+    monkeypatch.setattr(reranker, "score_cache", reranker.ScoreCache())
+
+
+def _ids(hits):
+    return [h["id"] for h in hits]
+
+
+def test_scores_reorder_the_hits(monkeypatch):
+    monkeypatch.setattr(reranker, "get_cross_encoder", lambda: FakeCrossEncoder())
+    reranker._cross_encoder_by(time.perf_counter() + 5)
+    assert _ids(reranker.rerank("q", HITS, top_k=3, budget_ms=1000)) == ["39", "38", "37"]
+
+
+def test_vector_order_while_the_model_is_loading(monkeypatch):
+    def slow_load():
+        time.sleep(0.3)
+        return FakeCrossEncoder()
+    monkeypatch.setattr(reranker, "get_cross_encoder", slow_load)
+    t0 = time.perf_counter()
+    assert _ids(reranker.rerank("q", HITS, top_k=3, budget_ms=50)) == ["0", "1", "2"]
+    assert time.perf_counter() - t0 < 0.25
+    reranker._loader.join(5)
+    assert _ids(reranker.rerank("q", HITS, top_k=3, budget_ms=1000)) == ["39", "38", "37"]
+
+
+def test_a_batch_over_the_budget_falls_back(monkeypatch):
+    monkeypatch.setattr(reranker, "get_cross_encoder", lambda: FakeCrossEncoder(batch_s=0.1))
+    reranker._cross_encoder_by(time.perf_counter() + 5)
+    assert _ids(reranker.rerank("q", HITS, top_k=3, budget_ms=50, batch_size=40)) == ["0", "1", "2"]
+
+
+def test_failed_load_falls_back_and_retries_after_the_backoff(monkeypatch):
+    loads = []
+
+    def failing_load():
+        loads.append(1)
+        raise OSError("offline")
+    monkeypatch.setattr(reranker, "get_cross_encoder", failing_load)
+    monkeypatch.setattr(reranker, "RERANK_LOAD_RETRY_S", 60)
+    assert _ids(reranker.rerank("q", HITS, top_k=3, budget_ms=50)) == ["0", "1", "2"]
+    assert _ids(reranker.rerank("q", HITS, top_k=3, budget_ms=50)) == ["0", "1", "2"]
+    assert len(loads) == 1
+    monkeypatch.setattr(reranker, "_load_failed_at", time.monotonic() - 61)
+    monkeypatch.setattr(reranker, "get_cross_encoder", lambda: FakeCrossEncoder())
+    reranker.rerank("q", HITS, top_k=3, budget_ms=50)
+    reranker._loader.join(5)
+    assert _ids(reranker.rerank("q", HITS, top_k=3, budget_ms=1000)) == ["39", "38", "37"]
@@ -0,0 +1,67 @@
+import pytest
+import sessions
+
+
+@pytest.fixture(autouse=True)
+def small_limits(monkeypatch):
+    monkeypatch.setattr(sessions, "SESSION_MAX_TURNS", 2)
+    monkeypatch.setattr(sessions, "SESSION_MAX_CHARS", 500)
+    monkeypatch.setattr(sessions, "SESSION_SUMMARY_CHARS", 120)
+
+
+def _session(turns):
+    return {"summary": "", "turns": [list(t) for t in turns], "updated": 0}
+
+
+def test_compact_folds_the_oldest_turns_into_the_summary():
+    session = sessions.compact(_session([
+        ("Is nickel allergy common?", "Yes, quite. It is the most common contact allergen."),
+        ("What about cobalt?", "Less common. Mostly with nickel."),
+        ("And chromium?", "Seen in cement workers."),
+    ]))
+    assert [q for q, _ in session["turns"]] == ["What about cobalt?", "And chromium?"]
+    assert session["summary"] == "Q: Is nickel allergy common? A: Yes, quite."
+
+
+def test_compact_enforces_the_character_cap():
+    session = sessions.compact(_session([("q1", "a" * 300), ("q2", "b" * 300)]))
+    assert [q for q, _ in session["turns"]] == ["q2"]
+    assert sessions._size(session) <= 500
+
+
+def test_summary_drops_its_oldest_lines_when_full():
+    session = _session([])
+    for i in range(10):
+        session["turns"].append([f"Question number {i}?", f"Answer number {i}. More detail."])
+        sessions.compact(session)
+    assert len(session["summary"]) <= 120
+    lines = session["summary"].split("\n")
+    assert lines[-1] == "Q: Question number 7? A: Answer number 7."
+    assert "Question number 0?" not in session["summary"]
+
+
+def test_compact_leaves_a_small_session_alone():
+    session = _session([("q", "a")])
+    assert sessions.compact(session) == _session([("q", "a")])
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_concurrent_turns_are_all_kept(backend, tmp_path, monkeypatch):
+    import threading
+    monkeypatch.setattr(sessions, "SESSION_MAX_TURNS", 100)
+    monkeypatch.setattr(sessions, "SESSION_MAX_CHARS", 100000)
+    if backend == "sqlite":
+        store = sessions.SessionStore(sessions.SqliteSessionBackend(str(tmp_path / "sessions.db")))
+    else:
+        store = sessions.SessionStore(sessions.MemorySessionBackend())
+
+    def ask(worker):
+        for i in range(10):
+            store.append("session-1", f"q{worker}-{i}", "a")
+
+    threads = [threading.Thread(target=ask, args=(w,)) for w in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(store.get("session-1")["turns"]) == 40
@@ -0,0 +1,80 @@
+import os
+import json
+import numpy as np
+import pytest
+from vector_store import NumpyVectorStore, get_vector_store, numpy_index_exists
+
+
+def _vectors(n, dim=4, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def test_upsert_replaces_instead_of_duplicating(tmp_path):
+    store = NumpyVectorStore(tmp_path / "c")
+    store.add(["a", "b"], _vectors(2), ["doc a", "doc b"])
+    store.upsert(["b", "c"], _vectors(2, seed=1), ["doc b2", "doc c"])
+    assert sorted(store.list_ids()) == ["a", "b", "c"]
+    with pytest.raises(ValueError):
+        store.add(["a"], _vectors(1), ["again"])
+    vec = _vectors(2, seed=1)[0]
+    assert store.query(vec, k=1)[0]["document"] == "doc b2"
+
+
+def test_persist_switches_matrix_and_documents_together(tmp_path):
+    path = tmp_path / "c"
+    store = NumpyVectorStore(path)
+    store.add(["a", "b"], _vectors(2), ["doc a", "doc b"])
+    store.persist()
+    first = (path / "CURRENT").read_text()
+    store.upsert(["c"], _vectors(1, seed=2), ["doc c"])
+    store.persist()
+    current = (path / "CURRENT").read_text()
+    assert current != first
+    with open(path / current / "docs.json", encoding="utf-8") as f:
+        assert json.load(f)["ids"] == ["a", "b", "c"]
+    assert np.load(path / current / "embeddings.npy").shape == (3, 4)
+    # one generation back is kept for readers that are still loading it, older ones are removed
+    store.persist()
+    assert sorted(p.name for p in path.glob("gen-*")) == sorted([current, (path / "CURRENT").read_text()])
+    assert NumpyVectorStore(path).list_ids() == ["a", "b", "c"]
+
+
+def test_get_vector_store_opens_a_persisted_index(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        get_vector_store("allergy", tmp_path, backend="numpy")
+    store = get_vector_store("allergy", tmp_path, backend="numpy", create=True)
+    store.add(["a"], _vectors(1), ["doc a"])
+    store.persist()
+    assert get_vector_store("allergy", tmp_path, backend="numpy").list_ids() == ["a"]
+
+
+def test_older_single_directory_layout_still_loads(tmp_path):
+    path = tmp_path / "c"
+    path.mkdir()
+    np.save(path / "embeddings.npy", _vectors(1))
+    with open(path / "docs.json", "w", encoding="utf-8") as f:
+        json.dump({"ids": ["a"], "documents": ["doc a"], "metadatas": [None]}, f)
+    assert numpy_index_exists(path)
+    store = NumpyVectorStore(path)
+    assert store.list_ids() == ["a"]
+    store.persist()
+    assert not os.path.exists(path / "embeddings.npy")
+    assert NumpyVectorStore(path).list_ids() == ["a"]
+
+
+def test_persist_is_a_no_op_in_memory():
+    store = NumpyVectorStore(None)
+    store.add(["a"], _vectors(1), ["doc a"])
+    store.persist()
+    assert store.count() == 1
+
+
+def test_float16_scores_match_float32(tmp_path):
+    vectors, queries = _vectors(50), _vectors(3, seed=5)
+    stores = []
+    for dtype in ("float32", "float16"):
+        store = NumpyVectorStore(None, dtype=dtype)
+        store.add([str(i) for i in range(50)], vectors, [str(i) for i in range(50)])
+        stores.append(store)
+    for a, b in zip(*(s.query_batch(queries, k=5) for s in stores)):
+        assert [h["id"] for h in a] == [h["id"] for h in b]
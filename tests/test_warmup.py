@@ -0,0 +1,27 @@
+import json
+import warmup
+
+
+def _write(path, prompts, tail=""):
+    with open(path, "w", encoding="utf-8") as f:
+        for q in prompts:
+            f.write(json.dumps({"t": 0, "q": q}) + "\n")
+        f.write(tail)
+
+
+def test_top_prompts_counts_only_the_recent_window(tmp_path, monkeypatch):
+    path = str(tmp_path / "requests.jsonl")
+    _write(path + ".1", ["old"] * 50 + ["nickel allergy"] * 3)
+    _write(path, ["nickel allergy"] * 2 + ["new"] * 4, tail='{"t": 0, "q": "partial')
+    monkeypatch.setattr(warmup, "REQUEST_LOG_WINDOW", 12)
+    # the window spans the end of the rotated file and all of the current one
+    assert warmup.top_prompts(n=10, min_count=2, path=path) == ["nickel allergy", "new", "old"]
+    assert warmup.top_prompts(n=1, min_count=2, path=path) == ["nickel allergy"]
+
+
+def test_log_prompt_appends_normalized_prompts(tmp_path, monkeypatch):
+    path = str(tmp_path / "logs" / "requests.jsonl")
+    monkeypatch.setattr(warmup, "REQUEST_LOG_PATH", path)
+    warmup.log_prompt("  Is NICKEL allergy common? ")
+    warmup.log_prompt("   ")
+    assert warmup.top_prompts(min_count=1, path=path) == ["is nickel allergy common"]
@@ -0,0 +1,270 @@
+# vector_store.py
+# Pluggable vector stores: Chroma for large corpora, a plain NumPy matrix for small ones.
+import os
+import json
+import time
+import shutil
+from pathlib import Path
+import numpy as np
+from dotenv import load_dotenv
+load_dotenv()
+
+# "chroma" (default) or "numpy"
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma")
+
+
+class VectorStore:
+    """
+    Common interface used by the RAG call and the indexers.
+    Query results are lists of hits: {"id", "document", "metadata", "distance"},
+    best first. Distances are cosine distances (1 - cosine similarity) for the
+    NumPy backend and whatever the collection space is for Chroma.
+    """
+
+    def add(self, ids, embeddings, documents, metadatas=None):
+        raise NotImplementedError
+
+    def upsert(self, ids, embeddings, documents, metadatas=None):
+        raise NotImplementedError
+
+    def delete(self, ids):
+        raise NotImplementedError
+
+    def query_batch(self, embeddings, k=5):
+        raise NotImplementedError
+
+    def query(self, embedding, k=5):
+        return self.query_batch([embedding], k)[0]
+
+    def count(self):
+        raise NotImplementedError
+
+    def list_ids(self):
+        raise NotImplementedError
+
+    def exists(self):
+        """False once the collection has been dropped (e.g. by a later index rebuild)."""
+        return True
+
+    def persist(self):
+        pass
+
+
+class ChromaVectorStore(VectorStore):
+    def __init__(self, collection_name, persist_dir=None, create=False, metadata=None, client=None):
+        import chromadb
+
+        # an explicit client (e.g. chromadb.EphemeralClient()) overrides persist_dir
+        self.client = client or chromadb.PersistentClient(path=str(persist_dir))
+        if create:
+            self.collection = self.client.get_or_create_collection(name=collection_name, metadata=metadata)
+        else:
+            self.collection = self.client.get_collection(collection_name)
+
+    def add(self, ids, embeddings, documents, metadatas=None):
+        self.collection.add(ids=list(ids), embeddings=_as_lists(embeddings), documents=list(documents),
+                            metadatas=metadatas)
+
+    def upsert(self, ids, embeddings, documents, metadatas=None):
+        self.collection.upsert(ids=list(ids), embeddings=_as_lists(embeddings), documents=list(documents),
+                               metadatas=metadatas)
+
+    def delete(self, ids):
+        self.collection.delete(ids=list(ids))
+
+    def query_batch(self, embeddings, k=5):
+        results = self.collection.query(query_embeddings=_as_lists(embeddings), n_results=k)
+        all_metas = results.get("metadatas")
+        batches = []
+        for qi in range(len(results["ids"])):
+            metas = (all_metas[qi] if all_metas else None) or [None] * len(results["ids"][qi])
+            batches.append([
+                {"id": doc_id, "document": doc, "metadata": meta, "distance": dist}
+                for doc_id, doc, meta, dist in zip(results["ids"][qi], results["documents"][qi],
+                                                   metas, results["distances"][qi])
+            ])
+        return batches
+
+    def count(self):
+        return self.collection.count()
+
+    def list_ids(self):
+        return self.collection.get(include=[])["ids"]
+
+    def exists(self):
+        try:
+            self.client.get_collection(self.collection.name)
+        except Exception:
+            return False
+        return True
+
+
+# rows of a float16 matrix upcast to float32 at a time when scoring
+_UPCAST_BLOCK = 8192
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Brute-force store for small corpora. Embeddings are L2-normalized and kept in a
+    single .npy matrix that is memory-mapped read-only at serving time, so top-k is
+    one matrix-vector product plus `argpartition`. Documents and metadata are kept
+    in a JSON sidecar. Each `persist` writes both files to a new generation directory
+    and then switches `<path>/CURRENT` to it, so a reader always gets a matching pair.
+    With `path=None` the store lives in memory only.
+    """
+
+    def __init__(self, path, dtype="float32"):
+        self.path = Path(path) if path else None
+        self.dtype = np.dtype(dtype)
+        self.ids, self.documents, self.metadatas = [], [], []
+        self.matrix = None
+        self._positions = {}
+        if self.path and numpy_index_exists(self.path):
+            self._load()
+
+    def _load(self):
+        current = _current_generation(self.path)
+        with open(current / "docs.json", "r", encoding="utf-8") as f:
+            docs = json.load(f)
+        self.ids = docs["ids"]
+        self.documents = docs["documents"]
+        self.metadatas = docs["metadatas"]
+        self.matrix = np.load(current / "embeddings.npy", mmap_mode="r")
+        self.dtype = self.matrix.dtype
+        self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+    def _normalize(self, embeddings):
+        arr = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        norms = np.linalg.norm(arr, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return arr / norms
+
+    def add(self, ids, embeddings, documents, metadatas=None):
+        ids = [str(i) for i in ids]
+        duplicates = [i for i in ids if i in self._positions]
+        if duplicates or len(set(ids)) != len(ids):
+            raise ValueError(f"ids already in the store (use upsert to replace them): {duplicates[:5] or ids[:5]}")
+        new = self._normalize(embeddings).astype(self.dtype)
+        metadatas = metadatas or [None] * len(new)
+        self.matrix = new if self.matrix is None else np.concatenate([np.asarray(self.matrix), new])
+        self.ids.extend(ids)
+        self.documents.extend(documents)
+        self.metadatas.extend(metadatas)
+        self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+    def upsert(self, ids, embeddings, documents, metadatas=None):
+        ids = [str(i) for i in ids]
+        existing = [i for i in ids if i in self._positions]
+        if existing:
+            self.delete(existing)
+        self.add(ids, embeddings, documents, metadatas)
+
+    def delete(self, ids):
+        drop = {self._positions[str(i)] for i in ids if str(i) in self._positions}
+        if not drop:
+            return
+        keep = [i for i in range(len(self.ids)) if i not in drop]
+        self.matrix = np.asarray(self.matrix)[keep]
+        self.ids = [self.ids[i] for i in keep]
+        self.documents = [self.documents[i] for i in keep]
+        self.metadatas = [self.metadatas[i] for i in keep]
+        self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+    def query_batch(self, embeddings, k=5):
+        if self.matrix is None or not len(self.ids):
+            return [[] for _ in range(len(embeddings))]
+        queries = self._normalize(embeddings)
+        # (n_docs, dim) @ (dim, n_queries). NumPy has no BLAS kernel for float16, so a float16
+        # matrix is upcast to float32 in blocks: it halves memory at a small cost in speed.
+        if self.dtype == np.float32:
+            scores = (self.matrix @ queries.T).T
+        else:
+            scores = np.empty((len(queries), len(self.ids)), dtype=np.float32)
+            for start in range(0, len(self.ids), _UPCAST_BLOCK):
+                block = np.asarray(self.matrix[start:start + _UPCAST_BLOCK], dtype=np.float32)
+                scores[:, start:start + len(block)] = (block @ queries.T).T
+        k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        batches = []
+        for qi, row in enumerate(top):
+            order = row[np.argsort(-scores[qi, row])]
+            batches.append([
+                {"id": self.ids[i], "document": self.documents[i], "metadata": self.metadatas[i],
+                 "distance": float(1.0 - scores[qi, i])}
+                for i in order
+            ])
+        return batches
+
+    def count(self):
+        return len(self.ids)
+
+    def list_ids(self):
+        return list(self.ids)
+
+    def exists(self):
+        return self.path is None or numpy_index_exists(self.path)
+
+    def persist(self):
+        """Write matrix and sidecar as a new generation and switch to it in one step (no-op in memory)."""
+        if self.path is None:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        previous = _current_generation(self.path)
+        generation = f"gen-{time.time_ns()}-{os.getpid()}"
+        target = self.path / generation
+        target.mkdir()
+        matrix = np.asarray(self.matrix if self.matrix is not None else np.zeros((0, 0), dtype=self.dtype))
+        np.save(target / "embeddings.npy", matrix.astype(self.dtype))
+        with open(target / "docs.json", "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "documents": self.documents, "metadatas": self.metadatas}, f,
+                      ensure_ascii=False)
+        tmp_pointer = self.path / f"CURRENT.{os.getpid()}.tmp"
+        tmp_pointer.write_text(generation, encoding="utf-8")
+        os.replace(tmp_pointer, self.path / "CURRENT")
+        self._load()
+        # the previous generation stays for readers that looked up CURRENT just before the switch
+        for old in self.path.glob("gen-*"):
+            if old.name not in (generation, previous.name):
+                shutil.rmtree(old, ignore_errors=True)
+        for name in ("embeddings.npy", "docs.json"):  # files of the older single-directory layout
+            try:
+                (self.path / name).unlink()
+            except OSError:
+                pass
+
+
+def _current_generation(path):
+    """Directory with the live matrix and sidecar: the one named by <path>/CURRENT, else `path` itself."""
+    try:
+        return path / (path / "CURRENT").read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return path
+
+
+def numpy_index_exists(path):
+    return (_current_generation(Path(path)) / "embeddings.npy").exists()
+
+
+def _as_lists(embeddings):
+    return [e.tolist() if hasattr(e, "tolist") else list(e) for e in embeddings]
+
+
+def numpy_store_path(persist_dir, collection_name):
+    return Path(persist_dir) / "numpy" / collection_name
+
+
+def get_vector_store(collection_name, persist_dir, backend=None, create=False, metadata=None):
+    """
+    Open (or with `create=True`, create) the store for `collection_name`.
+    `backend` defaults to the VECTOR_BACKEND environment variable.
+    """
+    backend = backend or VECTOR_BACKEND
+    if backend == "numpy":
+        dtype = os.environ.get("NUMPY_STORE_DTYPE", "float32")
+        path = numpy_store_path(persist_dir, collection_name)
+        if not create and not numpy_index_exists(path):
+            raise FileNotFoundError(f"No NumPy index for '{collection_name}' at {path}; run the indexer first")
+        return NumpyVectorStore(path, dtype=dtype)
+    if backend == "chroma":
+        return ChromaVectorStore(collection_name, persist_dir, create=create, metadata=metadata)
+    raise ValueError(f"Unknown vector backend: {backend}")
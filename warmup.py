@@ -0,0 +1,236 @@
+# warmup.py
+# Precomputed answers for the most frequent questions. Normalized prompts from /api/ask
+# are logged; at startup and after every index rebuild the top ones are retrieved and
+# answered in the background at background priority, and /ready reports 503 until done.
+import os
+import json
+import time
+import threading
+from collections import Counter, deque
+from dotenv import load_dotenv
+from llm_governor import AnswerCache, TokenBucket, PRIORITY_BACKGROUND
+load_dotenv()
+
+# 0 disables warm-up (the node is ready immediately)
+WARMUP_TOP_N = int(os.environ.get("WARMUP_TOP_N", "50"))
+# prompts asked fewer times than this are not worth a Gemini call
+WARMUP_MIN_COUNT = int(os.environ.get("WARMUP_MIN_COUNT", "2"))
+# Gemini calls per minute spent on warm-up (per server, not per worker)
+WARMUP_RPM = float(os.environ.get("WARMUP_RPM", "20"))
+# the node reports ready after this long even if warm-up has not finished
+WARMUP_READY_TIMEOUT_S = float(os.environ.get("WARMUP_READY_TIMEOUT_S", "300"))
+REQUEST_LOG_PATH = os.environ.get("REQUEST_LOG_PATH", "logs/requests.jsonl")
+# only the most recent lines are mined; the log is rotated to <path>.1 above this size
+REQUEST_LOG_WINDOW = int(os.environ.get("REQUEST_LOG_WINDOW", "100000"))
+REQUEST_LOG_MAX_BYTES = int(os.environ.get("REQUEST_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+# warm answers per index version, shared by the server's worker processes
+WARMUP_DIR = os.environ.get("WARMUP_DIR", "logs/warmup")
+# saved warm answers are reused by restarts on the same index version for this long
+WARMUP_MAX_AGE_S = float(os.environ.get("WARMUP_MAX_AGE_S", str(24 * 3600)))
+# a worker that holds the warm-up lock longer than this is assumed dead
+WARMUP_LOCK_TIMEOUT_S = 900
+
+normalize = AnswerCache.normalize
+_log_lock = threading.Lock()
+
+
+def log_prompt(prompt):
+    """Append a normalized prompt to the request log (one JSON line, safe across worker processes)."""
+    key = normalize(prompt)
+    if not key:
+        return
+    line = json.dumps({"t": int(time.time()), "q": key}, ensure_ascii=False) + "\n"
+    try:
+        with _log_lock:
+            os.makedirs(os.path.dirname(REQUEST_LOG_PATH) or ".", exist_ok=True)
+            if os.path.exists(REQUEST_LOG_PATH) and os.path.getsize(REQUEST_LOG_PATH) > REQUEST_LOG_MAX_BYTES:
+                os.replace(REQUEST_LOG_PATH, REQUEST_LOG_PATH + ".1")
+            with open(REQUEST_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(line)
+    except OSError as e:
+        print("Could not write request log:", e)
+
+
+def top_prompts(n=WARMUP_TOP_N, min_count=WARMUP_MIN_COUNT, path=REQUEST_LOG_PATH):
+    """The `n` most frequent normalized prompts in the recent request log (rotated file included)."""
+    # stream both files through a bounded deque: only the last REQUEST_LOG_WINDOW lines are kept
+    lines = deque(maxlen=REQUEST_LOG_WINDOW)
+    for p in (path + ".1", path):
+        if os.path.exists(p):
+            with open(p, "r", encoding="utf-8") as f:
+                lines.extend(f)
+    counts = Counter()
+    for line in lines:
+        try:
+            counts[json.loads(line)["q"]] += 1
+        except (ValueError, KeyError):
+            continue  # a partially written line
+    return [q for q, c in counts.most_common(n) if c >= min_count]
+
+
+class WarmStore:
+    """Precomputed answers keyed by (normalized prompt, index version); one version is kept at a time."""
+
+    def __init__(self):
+        self.version = None
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, prompt, version):
+        with self._lock:
+            return self._data.get((normalize(prompt), version))
+
+    def put(self, prompt, version, entry):
+        with self._lock:
+            if version != self.version:
+                return  # computed for an index that is no longer serving
+            self._data[(normalize(prompt), version)] = entry
+
+    def reset(self, version):
+        """Drop every entry tied to another index version."""
+        with self._lock:
+            self.version = version
+            self._data = {k: v for k, v in self._data.items() if k[1] == version}
+
+    def __len__(self):
+        return len(self._data)
+
+
+class WarmUp:
+    def __init__(self, store=None):
+        self.store = store or WarmStore()
+        self.ready = threading.Event()
+        self.status = {"state": "idle", "version": None, "done": 0, "total": 0}
+        self._pid = None
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        """Start warming the current index once per process (worker processes start their own)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._started = time.monotonic()
+            self.ready.clear()
+        self._maybe_rewarm(_index_version())
+
+    def is_ready(self):
+        if not self.ready.is_set() and time.monotonic() - self._started > WARMUP_READY_TIMEOUT_S:
+            self.ready.set()  # don't keep the node out of rotation forever
+        return self.ready.is_set()
+
+    def lookup(self, prompt):
+        """The warm answer for `prompt` on the serving index, or None. Re-warms after a rebuild."""
+        self.ensure_started()
+        version = _index_version()
+        self._maybe_rewarm(version)
+        return self.store.get(prompt, version)
+
+    def _maybe_rewarm(self, version):
+        if WARMUP_TOP_N <= 0:
+            self.ready.set()
+            return
+        with self._lock:
+            if self.store.version == version:
+                return
+            self.store.reset(version)
+            self.status = {"state": "warming", "version": version, "done": 0, "total": 0}
+        threading.Thread(target=self._run, args=(version,), daemon=True).start()
+
+    def _run(self, version):
+        try:
+            entries = _shared_results(version, lambda: self._compute(version))
+            for prompt, entry in entries.items():
+                self.store.put(prompt, version, entry)
+            self.status.update(state="ready", done=len(entries), total=len(entries))
+            print(f"Warm-up for index {version}: {len(entries)} answers ready")
+        except Exception as e:
+            self.status.update(state="failed", error=str(e))
+            print("Warm-up failed:", e)
+        finally:
+            self.ready.set()
+
+    def _compute(self, version):
+        from gemini_api import retrieve, ask_gemini
+
+        prompts = top_prompts()
+        self.status["total"] = len(prompts)
+        api_key = os.environ.get("GEMINI_API_KEY")
+        bucket = TokenBucket(WARMUP_RPM, capacity=1)
+        entries = {}
+        for prompt in prompts:
+            if self.store.version != version:
+                break  # the index changed again; the next warm-up takes over
+            time.sleep(bucket.wait_time(1))
+            bucket.take(1)
+            hits = retrieve(prompt)
+            # background priority: interactive traffic is always admitted first
+            result = ask_gemini(prompt, api_key, hits=hits, priority=PRIORITY_BACKGROUND, deadline_s=120)
+            if not result["degraded"]:
+                entries[prompt] = {"answer": result["answer"], "sources": [h["id"] for h in hits]}
+            self.status["done"] += 1
+        return entries
+
+
+def _index_version():
+    from gemini_api import index_version
+
+    return index_version()
+
+
+def _shared_results(version, compute):
+    """
+    Warm answers for `version`, computed by one worker process and read by the others:
+    the first to take <dir>/<version>.lock computes and writes <version>.json. A file
+    older than WARMUP_MAX_AGE_S is recomputed (the top prompts move); until then it is served.
+    """
+    os.makedirs(WARMUP_DIR, exist_ok=True)
+    path = os.path.join(WARMUP_DIR, f"{version}.json")
+    lock = os.path.join(WARMUP_DIR, f"{version}.lock")
+    while True:
+        exists = os.path.exists(path)
+        if exists and time.time() - os.path.getmtime(path) < WARMUP_MAX_AGE_S:
+            return _read(path)
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if exists:
+                return _read(path)  # another worker is refreshing it; the old answers are still valid
+            try:
+                if time.time() - os.path.getmtime(lock) > WARMUP_LOCK_TIMEOUT_S:
+                    os.remove(lock)  # left behind by a worker that died mid warm-up
+            except OSError:
+                pass
+            time.sleep(1)
+            continue
+        os.close(fd)
+        try:
+            entries = compute()
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp, path)
+            _remove_other_versions(version)
+            return entries
+        finally:
+            os.remove(lock)
+
+
+def _read(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _remove_other_versions(version):
+    for name in os.listdir(WARMUP_DIR):
+        if name.endswith(".json") and name != f"{version}.json":
+            try:
+                os.remove(os.path.join(WARMUP_DIR, name))
+            except OSError:
+                pass
+
+
+warmup = WarmUp()